@@ -135,16 +135,15 @@ Keep response under 100 words. Focus on relevant objects and activities."""
     def _process_queue(self):
         """Background thread to process report queue."""
         while True:
+            # Block until a report is queued instead of polling the queue
+            event_data, snapshot_path = self.report_queue.get()
             try:
-                if not self.report_queue.empty():
-                    event_data, snapshot_path = self.report_queue.get(timeout=1)
-                    self._generate_report(event_data, snapshot_path)
-                    self.report_queue.task_done()
-                else:
-                    time.sleep(0.1)  # Small delay to prevent busy waiting
+                self._generate_report(event_data, snapshot_path)
             except Exception as e:
                 self.logger.error(f"Error in report processor: {e}")
                 time.sleep(1)
+            finally:
+                self.report_queue.task_done()
     
     def _generate_report(self, event_data: Dict, snapshot_path: str):
         """
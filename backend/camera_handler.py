@@ -5,14 +5,47 @@ Provides advanced camera management and stream handling capabilities.
 
 import cv2
 import numpy as np
+import sys
 import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, List, Callable, Tuple
 from queue import Queue, Empty
 import json
 
 
+def get_capture_backend() -> int:
+    """
+    Get the native OpenCV capture backend for this platform.
+    
+    Passing it explicitly skips OpenCV's backend auto-detection, which can
+    block for seconds on indices with no camera attached.
+    """
+    if sys.platform == 'darwin':
+        return cv2.CAP_AVFOUNDATION
+    if sys.platform.startswith('win'):
+        return cv2.CAP_DSHOW
+    if sys.platform.startswith('linux'):
+        return cv2.CAP_V4L2
+    return cv2.CAP_ANY
+
+
+def configure_capture(cap: cv2.VideoCapture, width: int = 1280, height: int = 720, fps: int = 30) -> None:
+    """
+    Request an MJPG stream at a fixed mode and a one-frame driver buffer.
+    
+    Asking for the mode explicitly skips OpenCV's format negotiation, and
+    MJPG frames are compressed on the camera and decoded by libjpeg-turbo,
+    which is much cheaper than converting raw YUY2 at the same resolution.
+    """
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+
 class CameraHandler:
     """
     Advanced camera handler for managing multiple camera streams.
@@ -58,26 +91,44 @@ class CameraHandler:
             List of working camera indices
         """
         self.logger.info(f"Discovering cameras (testing up to {max_cameras})...")
-        working_cameras = []
+        backend = get_capture_backend()
         
-        for i in range(max_cameras):
-            self.logger.info(f"Testing camera {i}...")
-            cap = cv2.VideoCapture(i)
-            
-            if cap.isOpened():
+        def probe(index: int) -> Tuple[int, bool, Optional[Dict]]:
+            cap = cv2.VideoCapture(index, backend)
+            try:
+                if not cap.isOpened():
+                    return index, False, None
                 # Try to read a frame
                 ret, frame = cap.read()
                 if ret and frame is not None:
-                    # Get camera properties
-                    properties = self._get_camera_properties(cap)
+                    return index, True, self._get_camera_properties(cap)
+                return index, True, None
+            finally:
+                cap.release()
+        
+        # Probe all indices concurrently; a missing camera can take seconds to time out.
+        # AVFoundation can only show the camera-permission prompt from the main thread,
+        # so on macOS the indices are probed one at a time on the calling thread
+        working_cameras = []
+        if sys.platform == 'darwin':
+            executor = None
+            probes = map(probe, range(max_cameras))
+        else:
+            executor = ThreadPoolExecutor(max_workers=max(1, max_cameras))
+            probes = executor.map(probe, range(max_cameras))
+        try:
+            for i, opened, properties in probes:
+                if properties is not None:
                     self.camera_properties[i] = properties
                     working_cameras.append(i)
                     self.logger.info(f"✓ Camera {i} working - {properties['width']}x{properties['height']} @ {properties['fps']} FPS")
-                else:
+                elif opened:
                     self.logger.warning(f"✗ Camera {i} opened but cannot read frames")
-                cap.release()
-            else:
-                self.logger.info(f"✗ Camera {i} not available")
+                else:
+                    self.logger.info(f"✗ Camera {i} not available")
+        finally:
+            if executor is not None:
+                executor.shutdown()
         
         self.logger.info(f"Found {len(working_cameras)} working cameras: {working_cameras}")
         return working_cameras
@@ -12,6 +12,9 @@ from pathlib import Path
 import google.generativeai as genai
 from PIL import Image
 import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 class GeminiImageAnalyzer:
@@ -338,7 +341,8 @@ class GeminiImageAnalyzer:
         self,
         image_paths: List[Union[str, Path]],
         analysis_type: str = "comprehensive",
-        max_workers: int = 3
+        max_workers: int = 3,
+        min_interval: float = 0.5
     ) -> List[Optional[Dict[str, Any]]]:
         """
         Analyze multiple images in batch.
@@ -347,29 +351,36 @@ class GeminiImageAnalyzer:
             image_paths: List of image file paths
             analysis_type: Type of analysis
             max_workers: Maximum concurrent workers (Gemini has rate limits)
+            min_interval: Minimum seconds between the starts of two requests
             
         Returns:
             List of analysis results
         """
-        results = []
+        throttle_lock = threading.Lock()
+        next_start = [time.monotonic()]
         
-        for i, image_path in enumerate(image_paths):
+        def wait_for_slot():
+            # Requests start at least min_interval apart, however many workers are idle
+            with throttle_lock:
+                start = max(next_start[0], time.monotonic())
+                next_start[0] = start + min_interval
+            time.sleep(max(0.0, start - time.monotonic()))
+        
+        def analyze(indexed_path):
+            i, image_path = indexed_path
+            wait_for_slot()
             self.logger.info(f"Processing image {i+1}/{len(image_paths)}: {image_path}")
             
             try:
-                result = self.analyze_image(image_path, analysis_type)
-                results.append(result)
-                
-                # Add small delay to respect rate limits
-                if i < len(image_paths) - 1:
-                    import time
-                    time.sleep(0.5)
-                    
+                return self.analyze_image(image_path, analysis_type)
             except Exception as e:
                 self.logger.error(f"Error in batch processing {image_path}: {e}")
-                results.append(None)
+                return None
         
-        return results
+        # Requests are network-bound, so run up to max_workers at once; the small worker
+        # cap and the start interval keep us within Gemini's rate limits
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            return list(executor.map(analyze, enumerate(image_paths)))
     
     def _compare_analyses(self, analysis1: Dict, analysis2: Dict) -> Dict[str, Any]:
         """Compare two analysis results."""
@@ -5,16 +5,121 @@ Automatically runs detection on every frame without manual trigger
 """
 
 import cv2
+import os
 import numpy as np
+import queue
+import sys
 import time
+import threading
+from collections import OrderedDict
 from improved_image_matcher import ImprovedImageMatcher
 
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from camera_handler import configure_capture, get_capture_backend
+
+FACE_CASCADE = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+def face_hashes(frame):
+    """64-bit perceptual hashes (pHash) of the faces in a frame, left to right; empty if none"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    faces = FACE_CASCADE.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(60, 60))
+    hashes = []
+    for x, y, w, h in sorted(faces, key=lambda face: face[0]):
+        # Low-frequency 8x8 DCT block of the face, thresholded at its median
+        small = cv2.resize(gray[y:y+h, x:x+w], (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+        low = cv2.dct(small)[:8, :8]
+        bits = (low > np.median(low)).flatten()
+        hashes.append(int(np.packbits(bits).view('>u8')[0]))
+    return tuple(hashes)
+
+class DetectionCache:
+    """Detection results keyed by the face hashes of a frame, with a short time-to-live
+    
+    A lookup hits when the same number of faces is in frame and each face hash is within
+    max_distance bits of the cached one, so sensor noise does not force a miss.
+    """
+    
+    def __init__(self, maxsize=64, ttl=5.0, max_distance=6):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.entries = OrderedDict()  # face hashes -> (stored_at, results)
+        self.hits = 0
+        self.misses = 0
+    
+    def _matches(self, key, cached_key):
+        return len(key) == len(cached_key) and all(
+            bin(a ^ b).count('1') <= self.max_distance for a, b in zip(key, cached_key))
+    
+    def get(self, key):
+        """Return cached results for a frame's face hashes, or None on a miss"""
+        now = time.time()
+        for cached_key, (stored_at, results) in list(self.entries.items()):
+            if now - stored_at > self.ttl:
+                del self.entries[cached_key]
+            elif self._matches(key, cached_key):
+                self.entries.move_to_end(cached_key)
+                self.hits += 1
+                return results
+        self.misses += 1
+        return None
+    
+    def put(self, key, results):
+        self.entries[key] = (time.time(), results)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return f"{self.hits}/{lookups} cache hits ({hit_rate:.0%})"
+
+class FrameGrabber(threading.Thread):
+    """Drain the camera on a background thread and decode only the frames that are asked for"""
+    
+    def __init__(self, cap):
+        super().__init__(name='frame-grabber', daemon=True)
+        self.cap = cap
+        self.frames = queue.Queue(maxsize=1)
+        self.wanted = threading.Event()
+        self.stopped = threading.Event()
+    
+    def run(self):
+        while not self.stopped.is_set():
+            # grab() empties the driver queue; retrieve() (the decode) only runs when read() is waiting
+            if not self.cap.grab():
+                break
+            if self.wanted.is_set():
+                ok, frame = self.cap.retrieve()
+                if not ok:
+                    break
+                self.wanted.clear()
+                self.frames.put(frame)
+        self.stopped.set()
+    
+    def read(self, timeout=1.0):
+        """Return (ret, frame) for the next frame off the camera, like cap.read()"""
+        self.wanted.set()
+        while not self.stopped.is_set():
+            try:
+                return True, self.frames.get(timeout=timeout)
+            except queue.Empty:
+                continue
+        return False, None
+    
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=2)
+
 def test_camera():
     """Test camera and basic detection"""
     print("🎥 Testing camera access...")
     
     # Try to open camera
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(0, get_capture_backend())
+    configure_capture(cap)
     if not cap.isOpened():
         print("❌ Cannot access camera. Please check:")
         print("  - Camera is connected")
@@ -51,7 +156,8 @@ def run_continuous_detection():
         return
     
     # Open camera
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(0, get_capture_backend())
+    configure_capture(cap)
     if not cap.isOpened():
         print("❌ Cannot open camera")
         return
@@ -63,8 +169,90 @@ def run_continuous_detection():
     detection_interval = 2.0  # Run detection every 2 seconds
     processing_detection = False
     
+    # Detection runs on a worker thread against the newest captured frame,
+    # so a slow match never stalls the capture/display loop
+    latest_frame = None
+    frame_lock = threading.Lock()
+    stop_event = threading.Event()
+    # The same faces seen again within a few seconds reuse the previous results
+    # instead of re-running the matcher
+    detection_cache = DetectionCache()
+    
+    def detection_worker():
+        nonlocal detection_results, last_detection_time, processing_detection
+        
+        # Sleep exactly until the next detection is due; stop_event wakes it immediately on exit
+        remaining = 0
+        while not stop_event.wait(remaining):
+            current_time = time.time()
+            if paused:
+                remaining = 0.25
+                continue
+            remaining = last_detection_time + detection_interval - current_time
+            if remaining > 0:
+                continue
+            
+            # Retry shortly if no frame is available yet or the detection fails
+            remaining = 0.05
+            with frame_lock:
+                frame = None if latest_frame is None else latest_frame.copy()
+            if frame is None:
+                continue
+            
+            processing_detection = True
+            print(f"🔍 Auto-detection #{frame_count//60}...")
+            
+            try:
+                # Frames without a detectable face are never cached
+                key = face_hashes(frame)
+                results = detection_cache.get(key) if key else None
+                if results is None:
+                    # Save temp frame
+                    cv2.imwrite("temp_frame.jpg", frame)
+                    
+                    # Run improved detection
+                    results = detector.identify_person_in_image("temp_frame.jpg", threshold=0.3)
+                    if key:
+                        detection_cache.put(key, results)
+                
+                if results:
+                    detection_results = results
+                    # Build the whole report and write it with a single call
+                    lines = [f"✅ Found {len(results)} potential matches:"]
+                    for i, result in enumerate(results, 1):
+                        name = result['offender_info'].get('name', result['offender_id'])
+                        confidence = result['confidence']
+                        method = result['method']
+                        methods_used = ', '.join(result['methods_used'])
+                        
+                        # Alert level based on confidence
+                        if confidence > 0.7:
+                            alert = "🚨 HIGH ALERT"
+                        elif confidence > 0.4:
+                            alert = "⚠️ MEDIUM"
+                        else:
+                            alert = "💡 LOW"
+                        
+                        lines.append(f"   {alert}: {name} - {confidence:.3f} (via {method})")
+                        lines.append(f"      Methods: {methods_used}")
+                    sys.stdout.write("\n".join(lines) + "\n")
+                else:
+                    detection_results = []
+                    print("❌ No matches detected")
+                
+                last_detection_time = current_time
+                
+            except Exception as e:
+                print(f"❌ Detection error: {e}")
+                detection_results = []
+            
+            processing_detection = False
+    
+    worker = threading.Thread(target=detection_worker, name='detection', daemon=True)
+    
     try:
         print("🚀 Continuous detection started!")
+        worker.start()
         while True:
             if not paused:
                 ret, frame = cap.read()
@@ -74,49 +262,9 @@ def run_continuous_detection():
                 frame_count += 1
                 current_time = time.time()
                 
-                # Automatic detection every interval
-                if (current_time - last_detection_time > detection_interval and 
-                    not processing_detection):
-                    processing_detection = True
-                    print(f"🔍 Auto-detection #{frame_count//60}...")
-                    
-                    try:
-                        # Save temp frame
-                        cv2.imwrite("temp_frame.jpg", frame)
-                        
-                        # Run improved detection
-                        results = detector.identify_person_in_image("temp_frame.jpg", threshold=0.3)
-                        
-                        if results:
-                            detection_results = results
-                            print(f"✅ Found {len(results)} potential matches:")
-                            for i, result in enumerate(results, 1):
-                                name = result['offender_info'].get('name', result['offender_id'])
-                                confidence = result['confidence']
-                                method = result['method']
-                                methods_used = ', '.join(result['methods_used'])
-                                
-                                # Alert level based on confidence
-                                if confidence > 0.7:
-                                    alert = "🚨 HIGH ALERT"
-                                elif confidence > 0.4:
-                                    alert = "⚠️ MEDIUM"
-                                else:
-                                    alert = "💡 LOW"
-                                
-                                print(f"   {alert}: {name} - {confidence:.3f} (via {method})")
-                                print(f"      Methods: {methods_used}")
-                        else:
-                            detection_results = []
-                            print("❌ No matches detected")
-                        
-                        last_detection_time = current_time
-                        
-                    except Exception as e:
-                        print(f"❌ Detection error: {e}")
-                        detection_results = []
-                    
-                    processing_detection = False
+                # Hand the newest frame to the detection worker
+                with frame_lock:
+                    latest_frame = frame
                 
                 # Create display frame
                 display_frame = frame.copy()
@@ -232,10 +380,13 @@ def run_continuous_detection():
     except KeyboardInterrupt:
         print("\n🛑 Stopped by user")
     finally:
+        stop_event.set()
+        if worker.is_alive():
+            worker.join(timeout=5)
         cap.release()
         cv2.destroyAllWindows()
         print("✅ Camera released")
-        print("📊 Detection session complete")
+        print(f"📊 Detection session complete: {detection_cache.stats()}")
 
 def run_high_frequency_detection():
     """Run high-frequency detection mode (every frame) - USE WITH CAUTION"""
@@ -256,7 +407,8 @@ def run_high_frequency_detection():
         return
     
     # Open camera
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(0, get_capture_backend())
+    configure_capture(cap)
     if not cap.isOpened():
         print("❌ Cannot open camera")
         return
@@ -265,11 +417,16 @@ def run_high_frequency_detection():
     paused = False
     detection_results = []
     
+    # Detection runs inline here, so capture moves to a grabber thread that
+    # keeps the driver queue drained and always hands back the current frame
+    grabber = FrameGrabber(cap)
+    
     try:
         print("🚀 High frequency detection started!")
+        grabber.start()
         while True:
             if not paused:
-                ret, frame = cap.read()
+                ret, frame = grabber.read()
                 if not ret:
                     break
                 
@@ -291,11 +448,12 @@ def run_high_frequency_detection():
                             # Only print high confidence results to avoid spam
                             high_conf_results = [r for r in results if r['confidence'] > 0.6]
                             if high_conf_results:
-                                print(f"🚨 HIGH CONFIDENCE MATCHES:")
+                                lines = [f"🚨 HIGH CONFIDENCE MATCHES:"]
                                 for result in high_conf_results:
                                     name = result['offender_info'].get('name', result['offender_id'])
                                     confidence = result['confidence']
-                                    print(f"   🚨 {name}: {confidence:.3f}")
+                                    lines.append(f"   🚨 {name}: {confidence:.3f}")
+                                sys.stdout.write("\n".join(lines) + "\n")
                         else:
                             detection_results = []
                         
@@ -356,6 +514,7 @@ def run_high_frequency_detection():
     except KeyboardInterrupt:
         print("\n🛑 Stopped by user")
     finally:
+        grabber.stop()
         cap.release()
         cv2.destroyAllWindows()
         print("✅ High frequency detection complete")
@@ -3,71 +3,244 @@
 Temporary script to download offender images from the extracted URLs
 """
 
+import hashlib
+import itertools
 import json
 import requests
 import os
+import shutil
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import urlparse
 import logging
 from typing import Dict, List, Optional
 import time
+import asyncio
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def download_image(image_url: str, offender_id: str, name: str = "") -> Optional[str]:
+IMAGES_DIR = Path("sex-offenders/images")
+CACHE_FILE = IMAGES_DIR / ".image_cache.json"
+
+# Try different headers to bypass protection
+HEADERS_LIST = [
+    {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'DNT': '1',
+        'Connection': 'keep-alive',
+        'Sec-Fetch-Dest': 'image',
+        'Sec-Fetch-Mode': 'no-cors',
+        'Sec-Fetch-Site': 'cross-site',
+        'Referer': 'https://www.icrimewatch.net/'
+    },
+    {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Referer': 'https://www.icrimewatch.net/'
+    },
+    {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+    }
+]
+
+EXTENSIONS_BY_CONTENT_TYPE = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/pjpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+}
+
+def _image_extension(content_type: str) -> str:
+    """Pick a file extension from a Content-Type header"""
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return EXTENSIONS_BY_CONTENT_TYPE.get(media_type, '.jpg')  # Default
+
+def _sniff_extension(head: bytes, content_type: str) -> str:
+    """Pick a file extension from the first bytes of an image, falling back to its Content-Type"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if head.startswith(b'\x89PNG'):
+        return '.png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    if head.startswith(b'GIF8'):
+        return '.gif'
+    return _image_extension(content_type)
+
+def load_cache() -> Dict[str, Dict]:
+    """Load the url -> {etag, last_modified, sha256, path} validator cache from earlier runs"""
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache: Dict[str, Dict]):
+    """Write the validator cache atomically, so an interrupted run can't corrupt it"""
+    tmp_file = CACHE_FILE.with_suffix('.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_file, CACHE_FILE)
+
+def _cached_entry(cache: Optional[Dict[str, Dict]], image_url: str) -> Optional[Dict]:
+    """Return the cache entry for a URL if its file is still on disk"""
+    entry = cache.get(image_url) if cache is not None else None
+    if entry and Path(entry['path']).exists():
+        return entry
+    return None
+
+def _conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+    """Build If-None-Match / If-Modified-Since headers from a cache entry"""
+    headers = {}
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def _make_cache_entry(response_headers, filepath: Path, sha256: str) -> Dict:
+    """Build the cache entry recorded after a successful download"""
+    return {
+        'etag': response_headers.get('ETag'),
+        'last_modified': response_headers.get('Last-Modified'),
+        'sha256': sha256,
+        'path': str(filepath),
+    }
+
+def _writev_all(fd: int, buffers: List[bytes]):
+    """Write all buffers with one writev call, finishing any short write with os.write"""
+    written = os.writev(fd, buffers)
+    if written < sum(len(buffer) for buffer in buffers):
+        remaining = memoryview(b''.join(buffers))[written:]
+        while remaining:
+            remaining = remaining[os.write(fd, remaining):]
+
+def write_chunks(filepath: Path, chunks, digest, batch_size: int = 4):
+    """Write byte chunks to a file and hash them, submitting several chunks per syscall where supported"""
+    # Write to a temporary file and rename it over the target, so an existing file that is
+    # hardlinked to other offenders' images is replaced rather than truncated in place
+    fd, temp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".part")
+    try:
+        if not hasattr(os, 'writev'):
+            # Windows has no writev; fall back to buffered writes
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    digest.update(chunk)
+        else:
+            try:
+                batch = []
+                for chunk in chunks:
+                    digest.update(chunk)
+                    batch.append(chunk)
+                    if len(batch) == batch_size:
+                        _writev_all(fd, batch)
+                        batch = []
+                if batch:
+                    _writev_all(fd, batch)
+            finally:
+                os.close(fd)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def create_session(pool_size: int = 32) -> requests.Session:
+    """Create a keep-alive session shared by all download threads, retrying transient errors with backoff"""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+class HostRateLimiter:
+    """Token bucket per host, so parallel downloads stay polite to each server"""
+    
+    def __init__(self, rate: float = 8.0, burst: int = 8):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # host -> (tokens, last refill time)
+        self._lock = threading.Lock()
+    
+    def acquire(self, url: str):
+        """Block until a request to the URL's host is allowed"""
+        host = urlparse(url).netloc
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+def download_image(session: requests.Session, image_url: str, offender_id: str, name: str = "",
+                   rate_limiter: Optional[HostRateLimiter] = None,
+                   cache: Optional[Dict[str, Dict]] = None) -> Optional[str]:
     """Download offender image with multiple strategies"""
     try:
         logger.info(f"Downloading image for {name} (ID: {offender_id}): {image_url}")
+        cached = _cached_entry(cache, image_url)
         
-        # Try different headers to bypass protection
-        headers_list = [
-            {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Sec-Fetch-Dest': 'image',
-                'Sec-Fetch-Mode': 'no-cors',
-                'Sec-Fetch-Site': 'cross-site',
-                'Referer': 'https://www.icrimewatch.net/'
-            },
-            {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Referer': 'https://www.icrimewatch.net/'
-            },
-            {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-        ]
-        
-        for i, headers in enumerate(headers_list):
+        for i, headers in enumerate(HEADERS_LIST):
             try:
                 logger.info(f"Trying download method {i+1} for {offender_id}")
-                response = requests.get(image_url, headers=headers, timeout=30)
-                
-                if response.status_code == 200:
-                    # Determine file extension
-                    content_type = response.headers.get('content-type', '')
-                    if 'jpeg' in content_type or 'jpg' in content_type:
-                        ext = '.jpg'
-                    elif 'png' in content_type:
-                        ext = '.png'
-                    else:
-                        ext = '.jpg'  # Default
+                if rate_limiter:
+                    rate_limiter.acquire(image_url)
+                # Stream the body straight to disk instead of buffering it in memory first
+                headers = {**headers, **_conditional_headers(cached)}
+                with session.get(image_url, headers=headers, timeout=30, stream=True) as response:
+                    if response.status_code == 304 and cached:
+                        logger.info(f"Image unchanged for {offender_id}")
+                        return cached['path']
+                    if response.status_code != 200:
+                        logger.warning(f"Method {i+1} failed with status {response.status_code}")
+                        continue
+                    
+                    # Determine file extension from the image's magic bytes
+                    response.raw.decode_content = True
+                    head = response.raw.read(12)
+                    ext = _sniff_extension(head, response.headers.get('content-type', ''))
                     
                     filename = f"{offender_id}{ext}"
-                    filepath = Path("sex-offenders/images") / filename
+                    filepath = IMAGES_DIR / filename
                     
-                    with open(filepath, 'wb') as f:
-                        f.write(response.content)
+                    digest = hashlib.sha256()
+                    chunks = itertools.chain([head], iter(lambda: response.raw.read(64 * 1024), b''))
+                    try:
+                        write_chunks(filepath, chunks, digest)
+                    except Exception:
+                        # Don't leave a truncated file that would count as downloaded next run
+                        filepath.unlink(missing_ok=True)
+                        raise
                     
-                    logger.info(f"Successfully downloaded image: {filename}")
-                    return str(filepath)
-                else:
-                    logger.warning(f"Method {i+1} failed with status {response.status_code}")
+                    if cache is not None:
+                        cache[image_url] = _make_cache_entry(response.headers, filepath, digest.hexdigest())
+                
+                logger.info(f"Successfully downloaded image: {filename}")
+                return str(filepath)
                     
             except Exception as e:
                 logger.warning(f"Method {i+1} failed: {e}")
@@ -80,6 +253,74 @@ def download_image(image_url: str, offender_id: str, name: str = "") -> Optional
         logger.error(f"Error downloading image {image_url}: {e}")
         return None
 
+async def download_image_async(session, semaphore: asyncio.Semaphore, image_url: str,
+                               offender_id: str, name: str = "",
+                               cache: Optional[Dict[str, Dict]] = None) -> Optional[str]:
+    """Download offender image on the event loop, trying each header set in turn"""
+    logger.info(f"Downloading image for {name} (ID: {offender_id}): {image_url}")
+    timeout = aiohttp.ClientTimeout(total=30)
+    cached = _cached_entry(cache, image_url)
+    
+    for i, headers in enumerate(HEADERS_LIST):
+        try:
+            logger.info(f"Trying download method {i+1} for {offender_id}")
+            headers = {**headers, **_conditional_headers(cached)}
+            async with semaphore, session.get(image_url, headers=headers, timeout=timeout) as response:
+                if response.status == 304 and cached:
+                    logger.info(f"Image unchanged for {offender_id}")
+                    return cached['path']
+                if response.status != 200:
+                    logger.warning(f"Method {i+1} failed with status {response.status}")
+                    continue
+                data = await response.read()
+                ext = _sniff_extension(data[:12], response.headers.get('content-type', ''))
+            
+            filename = f"{offender_id}{ext}"
+            filepath = IMAGES_DIR / filename
+            await asyncio.to_thread(filepath.write_bytes, data)
+            if cache is not None:
+                cache[image_url] = _make_cache_entry(response.headers, filepath, hashlib.sha256(data).hexdigest())
+            
+            logger.info(f"Successfully downloaded image: {filename}")
+            return str(filepath)
+            
+        except Exception as e:
+            logger.warning(f"Method {i+1} failed: {e}")
+    
+    logger.error(f"All download methods failed for {offender_id}")
+    return None
+
+async def download_all_async(pending: List, concurrency: int = 32,
+                             cache: Optional[Dict[str, Dict]] = None) -> List[Optional[str]]:
+    """Download every pending (url, offender_id, name) item on a single event loop"""
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=8, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await asyncio.gather(*(
+            download_image_async(session, semaphore, image_url, offender_id, name, cache)
+            for image_url, offender_id, name in pending
+        ))
+
+def link_image(source: Path, offender_id: str) -> Optional[str]:
+    """Give another offender a copy of an already downloaded image, hardlinking when possible"""
+    target = IMAGES_DIR / f"{offender_id}{source.suffix}"
+    try:
+        if target.exists():
+            if os.path.samefile(source, target):
+                # Already linked by an earlier run
+                return str(target)
+            target.unlink()
+        try:
+            os.link(source, target)
+        except OSError:
+            # Filesystems without hardlink support get a plain copy
+            shutil.copy2(source, target)
+        logger.info(f"Reused image {source.name} for {offender_id}")
+        return str(target)
+    except Exception as e:
+        logger.error(f"Error copying image {source} for {offender_id}: {e}")
+        return None
+
 def load_offender_data(json_file: str) -> List[Dict]:
     """Load offender data from JSON file"""
     try:
@@ -91,8 +332,12 @@ def load_offender_data(json_file: str) -> List[Dict]:
         logger.error(f"Error loading JSON file: {e}")
         return []
 
-def main():
-    """Main function to download images"""
+def main(max_workers: int = 16, refresh: bool = False):
+    """Main function to download images
+    
+    With refresh, images already on disk are revalidated with a conditional GET
+    (ETag / Last-Modified from the cache) instead of being skipped.
+    """
     # Load the offender data
     json_file = "sex-offenders/data/offenders_with_images.json"
     offenders = load_offender_data(json_file)
@@ -102,14 +347,22 @@ def main():
         return
     
     # Create images directory if it doesn't exist
-    images_dir = Path("sex-offenders/images")
+    images_dir = IMAGES_DIR
     images_dir.mkdir(exist_ok=True)
     
+    cache = load_cache()
     downloaded_count = 0
     failed_count = 0
     
     print(f"Starting image download for {len(offenders)} offenders...")
     
+    # Scan the images directory once instead of globbing it for every offender
+    with os.scandir(images_dir) as entries:
+        existing = {os.path.splitext(entry.name)[0] for entry in entries if entry.is_file()}
+    
+    # Collect the images that still need downloading, grouping offenders that
+    # share an image URL so each URL is fetched only once
+    pending = defaultdict(list)
     for i, offender in enumerate(offenders, 1):
         offender_id = offender.get('offender_id', f'offender_{i}')
         name = offender.get('name', 'Unknown')
@@ -121,25 +374,49 @@ def main():
             continue
         
         # Check if image already exists
-        existing_files = list(images_dir.glob(f"{offender_id}.*"))
-        if existing_files:
+        if offender_id in existing and not (refresh and _cached_entry(cache, image_url)):
             logger.info(f"Image already exists for {name} (ID: {offender_id})")
             downloaded_count += 1
             continue
         
-        # Download the image
-        result = download_image(image_url, offender_id, name)
-        if result:
-            downloaded_count += 1
-        else:
-            failed_count += 1
-        
-        # Add delay to be respectful
-        time.sleep(1)
-        
-        # Progress update
-        if i % 5 == 0:
-            print(f"Progress: {i}/{len(offenders)} offenders processed")
+        pending[image_url].append((offender_id, name))
+    
+    downloads = [(image_url, *owners[0]) for image_url, owners in pending.items()]
+    results = {}  # image_url -> downloaded path, or None on failure
+    if aiohttp is not None:
+        # All requests share one event loop, bounded by a semaphore and per-host connection limit
+        results = dict(zip(pending, asyncio.run(download_all_async(downloads, cache=cache))))
+    else:
+        # Download in parallel over one pooled session; the per-host rate limiter
+        # replaces the old fixed one-second delay between requests
+        session = create_session(pool_size=max_workers)
+        rate_limiter = HostRateLimiter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(download_image, session, image_url, offender_id, name, rate_limiter, cache): image_url
+                for image_url, offender_id, name in downloads
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                
+                # Progress update
+                if i % 5 == 0:
+                    print(f"Progress: {i}/{len(downloads)} downloads finished")
+    
+    for image_url, owners in pending.items():
+        filepath = results.get(image_url)
+        if not filepath:
+            failed_count += len(owners)
+            continue
+        downloaded_count += 1
+        # Every other offender with the same URL reuses the downloaded file
+        for offender_id, _ in owners[1:]:
+            if link_image(Path(filepath), offender_id):
+                downloaded_count += 1
+            else:
+                failed_count += 1
+    
+    save_cache(cache)
     
     print(f"\nDownload completed!")
     print(f"Successfully downloaded: {downloaded_count} images")
@@ -147,7 +424,7 @@ def main():
     print(f"Images saved to: {images_dir}")
     
     # List downloaded files
-    image_files = list(images_dir.glob("*"))
+    image_files = [f for f in images_dir.glob("*") if not f.name.startswith('.')]
     if image_files:
         print(f"\nDownloaded files:")
         for file in sorted(image_files):
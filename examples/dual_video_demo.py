@@ -11,6 +11,10 @@ import json
 # Web app base URL
 BASE_URL = "http://localhost:5001"
 
+# Shared keep-alive session so repeated status polls reuse one TCP connection
+SESSION = requests.Session()
+SESSION.mount('http://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4))
+
 def demo_dual_video_feeds():
     """Demo the dual video feed functionality."""
     print("🎥 YOLOv8 Dual Video Feed Demo")
@@ -19,7 +23,7 @@ def demo_dual_video_feeds():
     # Check server status
     print("1. Checking server status...")
     try:
-        response = requests.get(f"{BASE_URL}/api/status")
+        response = SESSION.get(f"{BASE_URL}/api/status")
         data = response.json()
         print(f"✅ Server is running - Processing: {data['is_processing']}")
     except Exception as e:
@@ -29,7 +33,7 @@ def demo_dual_video_feeds():
     # Get cameras
     print("\n2. Getting available cameras...")
     try:
-        response = requests.get(f"{BASE_URL}/api/cameras")
+        response = SESSION.get(f"{BASE_URL}/api/cameras")
         data = response.json()
         cameras = data['cameras']
         print(f"✅ Found {len(cameras)} cameras")
@@ -43,7 +47,7 @@ def demo_dual_video_feeds():
     # Start camera processing
     print("\n3. Starting camera processing...")
     try:
-        response = requests.post(f"{BASE_URL}/api/start_camera", json={
+        response = SESSION.post(f"{BASE_URL}/api/start_camera", json={
             'camera_index': 0,
             'confidence': 0.25,
             'enable_tracking': True
@@ -68,7 +72,7 @@ def demo_dual_video_feeds():
     for i in range(15):
         time.sleep(1)
         try:
-            response = requests.get(f"{BASE_URL}/api/status")
+            response = SESSION.get(f"{BASE_URL}/api/status")
             data = response.json()
             stats = data.get('stats', {})
             print(f"   Frame {stats.get('total_frames', 0)}: {stats.get('total_detections', 0)} detections, {stats.get('fps', 0):.1f} FPS")
@@ -78,7 +82,7 @@ def demo_dual_video_feeds():
     # Stop processing
     print("\n5. Stopping camera processing...")
     try:
-        response = requests.post(f"{BASE_URL}/api/stop_processing")
+        response = SESSION.post(f"{BASE_URL}/api/stop_processing")
         data = response.json()
         if data.get('status') == 'stopped':
             print("✅ Camera processing stopped")
@@ -10,26 +10,122 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
+from webdriver_manager.core.driver_cache import DriverCacheManager
 import time
 import csv
 import json
 import os
+import tempfile
 from pathlib import Path
 import logging
 from typing import Dict, List, Optional
 import requests
 from urllib.parse import urljoin
 import re
+import itertools
+import multiprocessing
+import asyncio
+
+try:
+    from playwright.async_api import async_playwright
+except ImportError:
+    async_playwright = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Filters for picking the offender photo out of a detail page's images
+_IMG_SKIP = re.compile(r'button|icon|logo|header|nav', re.IGNORECASE)
+_IMG_KEEP = re.compile(r'pictures|offender|photo|mugshot', re.IGNORECASE)
+
+# Reads each result row around the given detail links and classifies its cells
+# (image, number, alert level, address, city, ZIP, address type) page-side
+_RESULT_ROWS_JS = r"""
+function classify(text, index) {
+    if (index === 1 && /^\d+$/.test(text)) return 'number';
+    if (text.includes('Tier') || text.includes('Level')) return 'alert_level';
+    if (/\d+.*(?:ST|AVE|BLVD|DR|RD|PL|CT|WAY)/i.test(text)) return 'address';
+    if (text === text.toUpperCase() && text !== text.toLowerCase() && !/\d/.test(text) && text.length > 3) return 'city';
+    if (/^\d{5}$/.test(text)) return 'zip';
+    if (text.includes('Home Address') || text.includes('Work Address')) return 'address_type';
+    return null;
+}
+return arguments[0].map(link => {
+    const row = link.closest('tr');
+    const cells = row ? Array.from(row.querySelectorAll('td')) : [];
+    const fields = {};
+    cells.forEach((cell, index) => {
+        if (index === 0) {
+            const img = cell.querySelector('img');
+            if (img && img.src && img.src.includes('pictures')) fields.image_url = img.src;
+            return;
+        }
+        const text = (cell.innerText || '').trim();
+        const key = classify(text, index);
+        if (key) fields[key] = text;
+    });
+    return {name: (link.innerText || '').trim(), detail_url: link.href, cell_count: cells.length, fields: fields};
+});
+"""
+
+# Page-side extraction of a detail page: title, one [key, value] pair per table row (from
+# the row's own cells, so nested tables cannot shift the pairs) and every image. Shared by
+# the Selenium and the concurrent Playwright detail fetchers
+_DETAIL_EXTRACT_JS = """() => {
+    const heading = Array.from(document.querySelectorAll('h1, h2'))
+        .find(h => h.textContent.includes('Offender Details'));
+    const rows = Array.from(document.querySelectorAll('table tr'))
+        .map(tr => Array.from(tr.children).filter(c => c.tagName === 'TD'))
+        .filter(tds => tds.length >= 2)
+        .map(tds => [tds[0].innerText.trim(), tds[1].innerText.trim()]);
+    const images = Array.from(document.images).map(i => ({src: i.src || '', alt: i.alt || ''}));
+    return {page_title: heading ? heading.innerText : null, rows: rows, images: images};
+}"""
+
+
+def _pick_detail_image(images: List[Dict[str, str]]) -> Optional[str]:
+    """Pick the offender photo from a list of {src, alt} dicts describing a page's images"""
+    for img in images:
+        src = img['src']
+        if not src or not (_IMG_KEEP.search(src) or _IMG_KEEP.search(img['alt'])):
+            continue
+        if _IMG_SKIP.search(src):
+            continue
+        # Check if this looks like an offender photo
+        if _IMG_KEEP.search(src) or \
+           (len(src) > 50 and any(char.isdigit() for char in src)):  # Likely has offender ID
+            return src
+    return None
+
+
+def _details_from_extract(raw: Dict) -> Dict[str, str]:
+    """Turn the result of _DETAIL_EXTRACT_JS into a details dict"""
+    details = {}
+    if raw['page_title']:
+        details['page_title'] = raw['page_title']
+    for key, value in raw['rows']:
+        key = key.lower().replace(':', '')
+        if key and value:
+            details[key] = value
+    image_url = _pick_detail_image(raw['images'])
+    if image_url:
+        details['detail_image_url'] = image_url
+    return details
+
+
 class FinalSexOffenderScraper:
-    def __init__(self, headless: bool = False, delay: float = 2.0):
+    # Resolved chromedriver path, shared by every scraper in this process
+    _driver_path: Optional[str] = None
+    
+    def __init__(self, headless: bool = False, delay: float = 2.0, user_data_dir: Optional[str] = None,
+                 detail_concurrency: int = 0):
         self.delay = delay
+        # Detail pages loaded at once through Playwright (when installed); 0 visits them
+        # one at a time with the Selenium driver
+        self.detail_concurrency = detail_concurrency
         self.driver = None
         self.base_url = "https://www.icrimewatch.net"
         
@@ -38,8 +134,9 @@ class FinalSexOffenderScraper:
         self.images_dir = self.output_dir / "images"
         self.data_dir = self.output_dir / "data"
         
-        for dir_path in [self.output_dir, self.images_dir, self.data_dir]:
-            dir_path.mkdir(exist_ok=True)
+        # parents=True creates output_dir along with its subdirectories
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
         
         # Setup Chrome options
         self.chrome_options = Options()
@@ -53,11 +150,19 @@ class FinalSexOffenderScraper:
         self.chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         self.chrome_options.add_experimental_option('useAutomationExtension', False)
         self.chrome_options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+        
+        # Separate profile directories keep parallel Chrome instances from fighting over the profile lock
+        if user_data_dir:
+            self.chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
     
     def setup_driver(self):
         """Initialize the Chrome driver"""
         try:
-            service = Service(ChromeDriverManager().install())
+            if FinalSexOffenderScraper._driver_path is None:
+                # Trust a cached driver for 30 days before webdriver_manager checks for a newer one
+                cache_manager = DriverCacheManager(valid_range=30)
+                FinalSexOffenderScraper._driver_path = ChromeDriverManager(cache_manager=cache_manager).install()
+            service = Service(FinalSexOffenderScraper._driver_path)
             self.driver = webdriver.Chrome(service=service, options=self.chrome_options)
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
             logger.info("Chrome driver initialized successfully")
@@ -66,6 +171,26 @@ class FinalSexOffenderScraper:
             logger.error(f"Failed to initialize Chrome driver: {e}")
             return False
     
+    def open(self) -> bool:
+        """Start the Chrome driver unless one is already running"""
+        if self.driver is None:
+            return self.setup_driver()
+        return True
+    
+    def close(self):
+        """Quit the Chrome driver"""
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
+    
+    def __enter__(self):
+        if not self.open():
+            raise RuntimeError("Failed to initialize Chrome driver")
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
     def wait_for_page_load(self, timeout: int = 30):
         """Wait for page to load completely"""
         try:
@@ -113,13 +238,14 @@ class FinalSexOffenderScraper:
             offender_links = self.driver.find_elements(By.XPATH, "//a[contains(@href, 'offenderdetails.php')]")
             logger.info(f"Found {len(offender_links)} offender detail links")
             
+            # Read and classify every result row in one round trip
+            rows = self.driver.execute_script(_RESULT_ROWS_JS, offender_links)
+            
             # Extract data from each link
-            for i, link in enumerate(offender_links):
+            for i, row in enumerate(rows):
                 try:
-                    # Get the link text and URL
-                    name = link.text.strip()
-                    detail_url = link.get_attribute("href")
-                    
+                    name = row['name']
+                    detail_url = row['detail_url']
                     if not name or not detail_url:
                         continue
                     
@@ -131,11 +257,7 @@ class FinalSexOffenderScraper:
                     if not offender_id:
                         continue
                     
-                    # Find the parent row to extract other data
-                    row = link.find_element(By.XPATH, "./ancestor::tr")
-                    cells = row.find_elements(By.TAG_NAME, "td")
-                    
-                    if len(cells) < 8:
+                    if row['cell_count'] < 8:
                         continue
                     
                     offender_data = {
@@ -143,45 +265,7 @@ class FinalSexOffenderScraper:
                         'name': name,
                         'detail_url': detail_url
                     }
-                    
-                    # Extract data from each cell
-                    for j, cell in enumerate(cells):
-                        cell_text = cell.text.strip()
-                        
-                        # Extract image from first cell
-                        if j == 0:
-                            try:
-                                img_tag = cell.find_element(By.TAG_NAME, "img")
-                                if img_tag:
-                                    img_src = img_tag.get_attribute("src")
-                                    if img_src and "pictures" in img_src:
-                                        offender_data['image_url'] = img_src
-                            except NoSuchElementException:
-                                pass
-                        
-                        # Extract number (usually in second cell)
-                        elif j == 1 and cell_text.isdigit():
-                            offender_data['number'] = cell_text
-                        
-                        # Extract alert level (contains "Tier" or "Level")
-                        elif "Tier" in cell_text or "Level" in cell_text:
-                            offender_data['alert_level'] = cell_text
-                        
-                        # Extract address (contains numbers and street names)
-                        elif re.search(r'\d+.*(?:ST|AVE|BLVD|DR|RD|PL|CT|WAY)', cell_text, re.IGNORECASE):
-                            offender_data['address'] = cell_text
-                        
-                        # Extract city (all caps, no numbers)
-                        elif cell_text.isupper() and not any(char.isdigit() for char in cell_text) and len(cell_text) > 3:
-                            offender_data['city'] = cell_text
-                        
-                        # Extract ZIP (5 digits)
-                        elif cell_text.isdigit() and len(cell_text) == 5:
-                            offender_data['zip'] = cell_text
-                        
-                        # Extract address type
-                        elif "Home Address" in cell_text or "Work Address" in cell_text:
-                            offender_data['address_type'] = cell_text
+                    offender_data.update(row['fields'])
                     
                     offenders.append(offender_data)
                     logger.info(f"Extracted data for offender {len(offenders)}: {name}")
@@ -234,71 +318,69 @@ class FinalSexOffenderScraper:
             if not self.wait_for_page_load():
                 return details
             
-            # Extract basic information from the page
-            try:
-                # Look for the offender name in the page title or headers
-                name_element = self.driver.find_element(By.XPATH, "//h1[contains(text(), 'Offender Details')] | //h2[contains(text(), 'Offender Details')]")
-                if name_element:
-                    details['page_title'] = name_element.text
-            except NoSuchElementException:
-                pass
-            
-            # Extract information from tables
-            try:
-                tables = self.driver.find_elements(By.TAG_NAME, "table")
-                for table in tables:
-                    rows = table.find_elements(By.TAG_NAME, "tr")
-                    for row in rows:
-                        cells = row.find_elements(By.TAG_NAME, "td")
-                        if len(cells) >= 2:
-                            key = cells[0].text.strip().lower().replace(':', '')
-                            value = cells[1].text.strip()
-                            if key and value:
-                                details[key] = value
-            except Exception as e:
-                logger.error(f"Error extracting table data: {e}")
-            
-            # Extract image from detail page - try multiple selectors
-            try:
-                # Try different selectors for the offender image
-                selectors = [
-                    "//img[contains(@src, 'pictures')]",
-                    "//img[contains(@src, 'offender')]",
-                    "//img[contains(@src, 'photo')]",
-                    "//img[contains(@src, 'mugshot')]",
-                    "//img[contains(@alt, 'offender')]",
-                    "//img[contains(@alt, 'photo')]",
-                    "//img[contains(@alt, 'mugshot')]"
-                ]
-                
-                for selector in selectors:
-                    try:
-                        img_elements = self.driver.find_elements(By.XPATH, selector)
-                        for img in img_elements:
-                            src = img.get_attribute("src")
-                            if src and not any(skip in src.lower() for skip in ['button', 'icon', 'logo', 'header', 'nav']):
-                                # Check if this looks like an offender photo
-                                if any(keyword in src.lower() for keyword in ['pictures', 'offender', 'photo', 'mugshot']) or \
-                                   (len(src) > 50 and any(char.isdigit() for char in src)):  # Likely has offender ID
-                                    details['detail_image_url'] = src
-                                    logger.info(f"Found detail page image: {src}")
-                                    break
-                        if 'detail_image_url' in details:
-                            break
-                    except:
-                        continue
-                        
-            except Exception as e:
-                logger.error(f"Error extracting image from detail page: {e}")
+            # Title, table rows and images in one round trip
+            details = _details_from_extract(self.driver.execute_script(f"return ({_DETAIL_EXTRACT_JS})();"))
+            if 'detail_image_url' in details:
+                logger.info(f"Found detail page image: {details['detail_image_url']}")
             
         except Exception as e:
             logger.error(f"Error scraping offender details: {e}")
         
         return details
     
+    async def _fetch_details_async(self, detail_urls: List[str], concurrency: int) -> Dict[str, Dict[str, str]]:
+        """Load detail pages concurrently in one Playwright browser, reusing the Selenium session cookies
+        
+        Only pages that loaded are in the result, so the caller can retry the rest.
+        """
+        cookies = []
+        for cookie in self.driver.get_cookies():
+            converted = {key: cookie[key] for key in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly') if key in cookie}
+            if 'expiry' in cookie:
+                converted['expires'] = cookie['expiry']
+            if cookie.get('sameSite') in ('Strict', 'Lax', 'None'):
+                converted['sameSite'] = cookie['sameSite']
+            cookies.append(converted)
+        user_agent = self.driver.execute_script("return navigator.userAgent")
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async with async_playwright() as playwright:
+            browser = await playwright.chromium.launch(headless=True)
+            try:
+                context = await browser.new_context(user_agent=user_agent)
+                await context.add_cookies(cookies)
+                
+                async def fetch(url: str) -> Optional[Dict[str, str]]:
+                    async with semaphore:
+                        logger.info(f"Scraping details from: {url}")
+                        page = await context.new_page()
+                        try:
+                            await page.goto(url, wait_until="load")
+                            raw = await page.evaluate(_DETAIL_EXTRACT_JS)
+                        except Exception as e:
+                            logger.error(f"Error scraping offender details: {e}")
+                            return None
+                        finally:
+                            await page.close()
+                            # Rate limiting: each concurrent slot waits before its next page
+                            await asyncio.sleep(self.delay)
+                    
+                    return _details_from_extract(raw)
+                
+                results = await asyncio.gather(*(fetch(url) for url in detail_urls))
+            finally:
+                await browser.close()
+        
+        return {url: details for url, details in zip(detail_urls, results) if details is not None}
+    
     def scrape_all_offenders(self, search_url: str) -> List[Dict[str, str]]:
-        """Main method to scrape all offenders"""
-        if not self.setup_driver():
+        """Main method to scrape all offenders
+        
+        Reuses the running driver when called inside a ``with`` block; otherwise
+        starts one for this call and quits it afterwards.
+        """
+        owns_driver = self.driver is None
+        if owns_driver and not self.setup_driver():
             return []
         
         try:
@@ -313,6 +395,17 @@ class FinalSexOffenderScraper:
                 logger.warning("No offenders found on the page")
                 return []
             
+            # With detail_concurrency set and Playwright installed, load the detail pages
+            # concurrently; pages that failed (or everything, otherwise) are visited one
+            # at a time with the Selenium driver
+            prefetched = {}
+            if self.detail_concurrency > 0 and async_playwright is not None:
+                detail_urls = [offender['detail_url'] for offender in offenders if 'detail_url' in offender]
+                try:
+                    prefetched = asyncio.run(self._fetch_details_async(detail_urls, self.detail_concurrency))
+                except Exception as e:
+                    logger.warning(f"Concurrent detail fetch failed, falling back to Selenium: {e}")
+            
             # Process each offender
             for i, offender in enumerate(offenders, 1):
                 logger.info(f"Processing offender {i}/{len(offenders)}: {offender.get('name', 'Unknown')}")
@@ -325,7 +418,11 @@ class FinalSexOffenderScraper:
                 
                 # Scrape detailed information
                 if 'detail_url' in offender:
-                    details = self.scrape_offender_details(offender['detail_url'])
+                    if offender['detail_url'] in prefetched:
+                        details = prefetched[offender['detail_url']]
+                    else:
+                        details = self.scrape_offender_details(offender['detail_url'])
+                        time.sleep(self.delay)  # Rate limiting
                     offender.update(details)
                     
                     # Download detail page image if different
@@ -333,14 +430,12 @@ class FinalSexOffenderScraper:
                         image_path = self.download_image(offender['detail_image_url'], offender.get('offender_id', f'offender_{i}'))
                         if image_path:
                             offender['local_image_path'] = image_path
-                
-                time.sleep(self.delay)  # Rate limiting
             
             return offenders
             
         finally:
-            if self.driver:
-                self.driver.quit()
+            if owns_driver:
+                self.close()
     
     def save_to_csv(self, offenders: List[Dict[str, str]], filename: str = "offenders.csv"):
         """Save offenders data to CSV file"""
@@ -351,11 +446,7 @@ class FinalSexOffenderScraper:
         filepath = self.data_dir / filename
         
         # Get all unique keys from all offenders
-        all_keys = set()
-        for offender in offenders:
-            all_keys.update(offender.keys())
-        
-        fieldnames = sorted(list(all_keys))
+        fieldnames = sorted({key for offender in offenders for key in offender})
         
         with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
@@ -378,17 +469,45 @@ class FinalSexOffenderScraper:
         logger.info(f"Saved {len(offenders)} offenders to {filepath}")
 
 
-def main():
+def _scrape_one(search_url: str) -> List[Dict[str, str]]:
+    """Scrape a single search URL in a worker process with its own Chrome instance"""
+    # A fresh profile per call, so pool workers that take several URLs never share one;
+    # it is removed once Chrome has quit
+    with tempfile.TemporaryDirectory(prefix="chrome-") as user_data_dir:
+        try:
+            with FinalSexOffenderScraper(headless=True, delay=3.0, user_data_dir=user_data_dir) as scraper:
+                return scraper.scrape_all_offenders(search_url)
+        except RuntimeError as e:
+            logger.error(f"Could not scrape {search_url}: {e}")
+            return []
+
+
+def scrape_search_urls(search_urls: List[str], processes: Optional[int] = None) -> List[Dict[str, str]]:
+    """Scrape several search URLs in parallel, one Chrome instance per worker process"""
+    if processes is None:
+        processes = min(4, os.cpu_count() or 1, len(search_urls))
+    
+    with multiprocessing.Pool(processes=processes) as pool:
+        return list(itertools.chain.from_iterable(pool.imap_unordered(_scrape_one, search_urls)))
+
+
+def main(search_urls: Optional[List[str]] = None, processes: Optional[int] = None):
     """Main function to run the scraper"""
     # Your specific search URL
-    search_url = "https://www.icrimewatch.net/results.php?AgencyID=55260&SubmitAddrSearch=1&AddrStreet=5+Seminary+Place&AddrCity=New+Brunswick&AddrState=31&AddrZip=08901&AddrZipPlus=08901&whichaddr=home_addr%7Ctemp_addr&excludeIncarcerated=0&radius=5"
+    if search_urls is None:
+        search_urls = ["https://www.icrimewatch.net/results.php?AgencyID=55260&SubmitAddrSearch=1&AddrStreet=5+Seminary+Place&AddrCity=New+Brunswick&AddrState=31&AddrZip=08901&AddrZipPlus=08901&whichaddr=home_addr%7Ctemp_addr&excludeIncarcerated=0&radius=5"]
     
     # Initialize scraper (set headless=True to run without browser window)
     scraper = FinalSexOffenderScraper(headless=False, delay=3.0)
     
     try:
-        # Scrape the data
-        offenders = scraper.scrape_all_offenders(search_url)
+        # Scrape the data - several URLs are sharded across worker processes unless
+        # processes=1, in which case one Chrome instance handles them back to back
+        if len(search_urls) > 1 and processes != 1:
+            offenders = scrape_search_urls(search_urls, processes)
+        else:
+            with scraper:
+                offenders = [offender for url in search_urls for offender in scraper.scrape_all_offenders(url)]
         
         if offenders:
             # Save to both CSV and JSON
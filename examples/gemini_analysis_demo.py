@@ -7,6 +7,7 @@ import os
 import sys
 import json
 import logging
+from functools import cached_property
 from pathlib import Path
 
 # Add backend to path
@@ -26,13 +27,33 @@ def setup_logging():
     )
 
 
-def demo_single_image_analysis():
+class DemoServices:
+    """Gemini services shared by the demos, each built on first use.
+    
+    A service that fails to build raises inside the demo that asked for it, so that demo
+    reports the error and the others still run; the next demo tries to build it again.
+    """
+    
+    @cached_property
+    def analyzer(self) -> GeminiImageAnalyzer:
+        return GeminiImageAnalyzer()
+    
+    @cached_property
+    def parser(self) -> GeminiResponseParser:
+        return GeminiResponseParser()
+    
+    @cached_property
+    def timeline_manager(self) -> TimelineManager:
+        return TimelineManager(snapshots_dir="../web_app/timeline_snapshots")
+
+
+def demo_single_image_analysis(services: DemoServices):
     """Demo analyzing a single image."""
     print("\n=== Single Image Analysis Demo ===")
     
     try:
         # Initialize analyzer
-        analyzer = GeminiImageAnalyzer()
+        analyzer = services.analyzer
         
         # Find a test image
         test_image_path = None
@@ -84,13 +105,13 @@ def demo_single_image_analysis():
         print(f"❌ Demo failed: {e}")
 
 
-def demo_batch_analysis():
+def demo_batch_analysis(services: DemoServices):
     """Demo batch analysis of multiple images."""
     print("\n=== Batch Analysis Demo ===")
     
     try:
         # Initialize analyzer
-        analyzer = GeminiImageAnalyzer()
+        analyzer = services.analyzer
         
         # Find test images
         image_paths = []
@@ -126,13 +147,13 @@ def demo_batch_analysis():
         print(f"❌ Batch demo failed: {e}")
 
 
-def demo_timeline_integration():
+def demo_timeline_integration(services: DemoServices):
     """Demo integration with timeline manager."""
     print("\n=== Timeline Integration Demo ===")
     
     try:
         # Initialize timeline manager
-        timeline_manager = TimelineManager(snapshots_dir="../web_app/timeline_snapshots")
+        timeline_manager = services.timeline_manager
         
         # Get recent events
         recent_events = timeline_manager.get_events(limit=3)
@@ -144,7 +165,7 @@ def demo_timeline_integration():
         print(f"Found {len(recent_events)} recent events")
         
         # Initialize timeline analyzer
-        timeline_analyzer = GeminiTimelineAnalyzer(timeline_manager)
+        timeline_analyzer = GeminiTimelineAnalyzer(timeline_manager, services.analyzer)
         
         # Analyze events
         for i, event in enumerate(recent_events):
@@ -157,8 +178,7 @@ def demo_timeline_integration():
                 print(f"✅ Event {i+1} analyzed successfully")
                 
                 # Extract key insights
-                parser = GeminiResponseParser()
-                insights = parser.extract_key_insights(result)
+                insights = services.parser.extract_key_insights(result)
                 if insights:
                     print(f"Key insights: {insights[0]}")
             else:
@@ -172,12 +192,12 @@ def demo_timeline_integration():
         print(f"❌ Timeline demo failed: {e}")
 
 
-def demo_parser_validation():
+def demo_parser_validation(services: DemoServices):
     """Demo JSON response parsing and validation."""
     print("\n=== Response Parser Demo ===")
     
     try:
-        parser = GeminiResponseParser()
+        parser = services.parser
         
         # Test with sample response
         sample_response = """
@@ -292,12 +312,16 @@ def main():
         demo_configuration()
         return
     
+    # Services are shared so every demo reuses the same model client, but each demo
+    # builds what it needs inside its own error handling
+    services = DemoServices()
+    
     # Run demos
     demo_configuration()
-    demo_single_image_analysis()
-    demo_batch_analysis()
-    demo_timeline_integration()
-    demo_parser_validation()
+    demo_single_image_analysis(services)
+    demo_batch_analysis(services)
+    demo_timeline_integration(services)
+    demo_parser_validation(services)
     
     print("\n🎉 All demos completed!")
     print("\nNext steps:")
@@ -5,9 +5,13 @@ This script runs YOLOv8n (nano) model for object detection on images, videos, or
 """
 
 import argparse
+import queue
+import sys
+import threading
 from pathlib import Path
 import torch
 import cv2
+import numpy as np
 
 # Fix for PyTorch 2.6+ weights_only security feature with ultralytics
 # Monkey patch torch.load to allow loading YOLOv8 models
@@ -20,27 +24,163 @@ torch.load = patched_torch_load
 
 from ultralytics import YOLO
 
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'backend'))
+from camera_handler import configure_capture, get_capture_backend
 
-def run_webcam(model, conf=0.25):
-    """Run detection on webcam feed"""
+SCRIPT_DIR = Path(__file__).resolve().parent
+VIDEO_SUFFIXES = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v'}
+
+
+def load_engine(precision='fp16', imgsz=640):
+    """Load a TensorRT engine for YOLOv8n, exporting and caching it next to this script on first use"""
+    engine_path = SCRIPT_DIR / f'yolov8n-{precision}.engine'
+    if not engine_path.exists():
+        print(f"Exporting YOLOv8n to TensorRT ({precision.upper()}), this only happens once...")
+        export_args = {'format': 'engine', 'device': 0, 'imgsz': imgsz}
+        if precision == 'int8':
+            export_args.update(int8=True, data='coco128.yaml')
+        else:
+            export_args['half'] = True
+        exported_path = YOLO('yolov8n.pt').export(**export_args)
+        Path(exported_path).replace(engine_path)
+        print(f"✓ Engine saved to {engine_path}")
+    return YOLO(str(engine_path), task='detect')
+
+
+def load_onnx(imgsz=640):
+    """Load YOLOv8n as an ONNX Runtime model for CPU-only machines, exporting and caching it on first use"""
+    onnx_path = SCRIPT_DIR / 'yolov8n.onnx'
+    if not onnx_path.exists():
+        print("Exporting YOLOv8n to ONNX, this only happens once...")
+        exported_path = YOLO('yolov8n.pt').export(format='onnx', imgsz=imgsz, simplify=True, opset=17)
+        Path(exported_path).replace(onnx_path)
+        print(f"✓ ONNX model saved to {onnx_path}")
+    return YOLO(str(onnx_path), task='detect')
+
+
+def compile_model(model, imgsz=640, example=None, half=False):
+    """Compile the PyTorch graph with torch.compile and warm it up, falling back to eager on failure
+    
+    The warm-up runs on `example` (a frame or uploaded tensor shaped like the real
+    inputs) so the first real frame does not trigger a recompile; without one it
+    uses a black imgsz x imgsz frame.
+    """
+    if int(torch.__version__.split('.')[0]) < 2:
+        print("torch.compile requires PyTorch 2.0+, running in eager mode")
+        return model
+    
+    eager_model = model.model
+    try:
+        print("Compiling model with torch.compile (the first run can take a minute)...")
+        model.model = torch.compile(model.model, mode='reduce-overhead', fullgraph=False)
+        # Pay the one-time compile cost before the camera loop starts
+        if example is None:
+            example = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        model.predict(example, imgsz=imgsz, half=half, verbose=False)
+        print("✓ Model compiled")
+    except Exception as e:
+        print(f"⚠️ torch.compile failed, running in eager mode: {e}")
+        model.model = eager_model
+    return model
+
+
+class PinnedFrameUploader:
+    """Letterbox webcam frames into a reusable pinned host buffer and upload them to the GPU
+    
+    The frame is resized into the top-left corner of an imgsz x imgsz canvas, so
+    boxes predicted on the uploaded tensor map back to the frame by dividing by
+    the returned scale.
+    """
+    
+    def __init__(self, imgsz=640, device='cuda'):
+        self.imgsz = imgsz
+        self.host = torch.empty((imgsz, imgsz, 3), dtype=torch.uint8).pin_memory()
+        self.host_view = self.host.numpy()
+        self.device_u8 = torch.empty_like(self.host, device=device)
+        self.device_input = torch.empty((1, 3, imgsz, imgsz), dtype=torch.float32, device=device)
+    
+    def __call__(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.imgsz / max(height, width)
+        new_w, new_h = round(width * scale), round(height * scale)
+        
+        self.host_view.fill(114)
+        self.host_view[:new_h, :new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        
+        # uint8 upload (1 byte/pixel), then BGR->RGB, HWC->CHW and normalize on the GPU in place
+        self.device_u8.copy_(self.host, non_blocking=True)
+        self.device_input[0].copy_(self.device_u8.permute(2, 0, 1).flip(0))
+        self.device_input.div_(255.0)
+        return self.device_input, scale
+
+
+def draw_detections(frame, result, names, color_table, scale=1.0):
+    """Draw boxes and labels from a result directly onto the frame, in place"""
+    boxes = result.boxes
+    if len(boxes) == 0:
+        return frame
+    
+    xyxy = (boxes.xyxy.cpu().numpy() / scale).astype(int)
+    classes = boxes.cls.cpu().numpy().astype(int)
+    confidences = boxes.conf.cpu().numpy()
+    for (x1, y1, x2, y2), cls, conf in zip(xyxy, classes, confidences):
+        color = color_table[cls]
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, f"{names[cls]} {conf:.2f}", (x1, max(y1 - 5, 15)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
+
+
+def create_window(name):
+    """Create an OpenGL-backed display window, falling back to a plain one without OpenGL support"""
+    try:
+        cv2.namedWindow(name, cv2.WINDOW_OPENGL | cv2.WINDOW_AUTOSIZE)
+    except cv2.error:
+        cv2.namedWindow(name, cv2.WINDOW_AUTOSIZE)
+
+
+def _put_latest(q, item):
+    """Put an item on a bounded queue, discarding the oldest entry if it is full"""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def run_webcam(model, conf=0.25, imgsz=640, infer_every=1, half=False, gpu_upload=True, torch_compile=False):
+    """Run detection on webcam feed
+    
+    With torch_compile the model is compiled here, warmed up on a real captured
+    frame sent through the same path as the inference loop.
+    """
     print("Opening webcam... Press 'q' to quit")
     
-    # Try different camera indices
-    cap = None
-    for camera_idx in [0, 1]:
+    # Try different camera indices with the platform's native backend, in order and on
+    # this thread (AVFoundation only shows its permission prompt on the main thread)
+    def try_camera(camera_idx):
         print(f"Trying camera index {camera_idx}...")
-        test_cap = cv2.VideoCapture(camera_idx)
+        test_cap = cv2.VideoCapture(camera_idx, get_capture_backend())
         if test_cap.isOpened():
-            # Try reading a frame to verify it works
+            # MJPG at a fixed mode with a one-frame buffer, so captures are never stale
+            configure_capture(test_cap)
+            # Try reading a frame to verify it works; this read also serves as the warm-up
             ret, _ = test_cap.read()
             if ret:
-                cap = test_cap
-                print(f"✓ Camera {camera_idx} working!")
-                break
-            else:
-                test_cap.release()
-        else:
-            test_cap.release()
+                return test_cap
+        test_cap.release()
+        return None
+    
+    cap = None
+    for camera_idx in [0, 1]:
+        cap = try_camera(camera_idx)
+        if cap is not None:
+            print(f"✓ Camera {camera_idx} working!")
+            break
     
     if cap is None:
         print("\n❌ Error: Could not access any camera")
@@ -54,39 +194,90 @@ def run_webcam(model, conf=0.25):
     print("Webcam opened successfully!")
     print("Press 'q' to quit\n")
     
-    # Give camera time to warm up
-    import time
-    time.sleep(1)
+    # Capture, inference and display run concurrently, linked by small drop-oldest queues
+    frame_q = queue.Queue(maxsize=2)
+    result_q = queue.Queue(maxsize=2)
+    stop = threading.Event()
     
-    frame_count = 0
-    try:
-        while cap.isOpened():
+    def capture_loop():
+        while not stop.is_set():
             ret, frame = cap.read()
             if not ret:
                 print("Error: Failed to read frame from webcam")
+                stop.set()
                 break
+            _put_latest(frame_q, frame)
+    
+    # On CUDA, frames go through one persistent pinned buffer instead of a fresh allocation per frame
+    uploader = PinnedFrameUploader(imgsz) if gpu_upload and torch.cuda.is_available() else None
+    
+    if torch_compile:
+        ret, frame = cap.read()
+        if ret:
+            example = uploader(frame)[0] if uploader is not None else frame
+            model = compile_model(model, imgsz=imgsz, example=example, half=half)
+    
+    def infer_loop():
+        # Only every `infer_every`-th frame is a keyframe that runs the detector;
+        # frames in between reuse the last boxes
+        last_detection = None
+        captured = 0
+        while not stop.is_set():
+            try:
+                frame = frame_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if last_detection is None or captured % infer_every == 0:
+                if uploader is not None:
+                    source, scale = uploader(frame)
+                else:
+                    source, scale = frame, 1.0
+                results = model.predict(source, conf=conf, imgsz=imgsz, half=half, verbose=False)
+                last_detection = (results, scale)
+            captured += 1
+            _put_latest(result_q, (frame, *last_detection))
+    
+    workers = [
+        threading.Thread(target=capture_loop, name='capture', daemon=True),
+        threading.Thread(target=infer_loop, name='inference', daemon=True),
+    ]
+    for worker in workers:
+        worker.start()
+    
+    window_name = 'YOLOv8n - Press Q to quit'
+    create_window(window_name)
+    
+    # One fixed color per class, so boxes keep their color between frames
+    color_table = np.random.RandomState(0).randint(0, 255, (len(model.names), 3)).tolist()
+    
+    frame_count = 0
+    try:
+        while not stop.is_set():
+            # The window is only redrawn when inference delivers a new frame;
+            # otherwise just pump the GUI event loop
+            try:
+                frame, results, scale = result_q.get_nowait()
+            except queue.Empty:
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    print("\nStopping detection...")
+                    break
+                continue
             
-            # Run inference
-            results = model(frame, conf=conf, verbose=False)
-            
-            # Get annotated frame
-            annotated_frame = results[0].plot()
+            # Draw detections straight onto the captured frame
+            annotated_frame = draw_detections(frame, results[0], model.names, color_table, scale)
             
             # Print detections every 30 frames
             if frame_count % 30 == 0:
                 boxes = results[0].boxes
                 if len(boxes) > 0:
                     print(f"Frame {frame_count}: Detected {len(boxes)} objects")
-                    detected = {}
-                    for box in boxes:
-                        cls = int(box.cls[0])
-                        class_name = model.names[cls]
-                        detected[class_name] = detected.get(class_name, 0) + 1
-                    for obj, count in detected.items():
-                        print(f"  - {obj}: {count}")
+                    # One device->host copy for all classes, then count on the CPU
+                    counts = np.bincount(boxes.cls.int().cpu().numpy(), minlength=len(model.names))
+                    for cls in counts.nonzero()[0]:
+                        print(f"  - {model.names[int(cls)]}: {counts[cls]}")
             
             # Display
-            cv2.imshow('YOLOv8n - Press Q to quit', annotated_frame)
+            cv2.imshow(window_name, annotated_frame)
             
             # Check for 'q' key to quit
             if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -98,11 +289,74 @@ def run_webcam(model, conf=0.25):
     except KeyboardInterrupt:
         print("\nDetection interrupted by user")
     finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=2)
         cap.release()
         cv2.destroyAllWindows()
         print(f"Processed {frame_count} frames")
 
 
+def print_detections(result, names):
+    """Print the class and confidence of every box in a result"""
+    boxes = result.boxes
+    
+    if len(boxes) > 0:
+        print(f"\nDetected {len(boxes)} objects:")
+        classes = boxes.cls.int().cpu().numpy()
+        confidences = boxes.conf.cpu().numpy()
+        for cls, conf in zip(classes, confidences):
+            print(f"  - {names[int(cls)]}: {conf:.2f}")
+    else:
+        print("No objects detected")
+
+
+def run_video(model, source, conf=0.25, imgsz=640, batch=16, save=False, output_dir='runs/detect', half=False):
+    """Run detection on a video file, feeding the model batches of frames"""
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        print(f"❌ Error: Could not open video {source}")
+        return
+    
+    writer = None
+    if save:
+        save_dir = Path(output_dir)
+        save_dir.mkdir(parents=True, exist_ok=True)
+        save_path = save_dir / f"{Path(source).stem}_detections.mp4"
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        writer = cv2.VideoWriter(str(save_path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    
+    stopped = False
+    try:
+        while not stopped:
+            # Read up to `batch` frames; offline video has no latency budget, so
+            # batching keeps the GPU busy with matrix-matrix work
+            frames = []
+            while len(frames) < batch:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frames.append(frame)
+            if not frames:
+                break
+            
+            for result in model(frames, conf=conf, imgsz=imgsz, half=half, verbose=False):
+                print_detections(result, model.names)
+                annotated_frame = result.plot()
+                if writer is not None:
+                    writer.write(annotated_frame)
+                cv2.imshow('YOLOv8n - Press Q to quit', annotated_frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    stopped = True
+                    break
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+        cv2.destroyAllWindows()
+
+
 def main():
     parser = argparse.ArgumentParser(description='Run YOLOv8n object detection')
     parser.add_argument(
@@ -128,22 +382,102 @@ def main():
         default='runs/detect',
         help='Directory to save results (default: runs/detect)'
     )
+    parser.add_argument(
+        '--engine',
+        choices=['fp16', 'int8'],
+        default=None,
+        help='Run a TensorRT engine at this precision instead of the PyTorch weights (requires an NVIDIA GPU)'
+    )
+    parser.add_argument(
+        '--runtime',
+        choices=['torch', 'onnx'],
+        default='torch',
+        help='Inference runtime: PyTorch, or ONNX Runtime for CPU-only machines (default: torch)'
+    )
+    parser.add_argument(
+        '--compile',
+        action='store_true',
+        help='Optimize the PyTorch model with torch.compile before running (PyTorch 2.0+)'
+    )
+    parser.add_argument(
+        '--imgsz',
+        type=int,
+        default=640,
+        help='Inference image size (default: 640)'
+    )
+    parser.add_argument(
+        '--infer-every',
+        type=int,
+        default=3,
+        help='Webcam only: run the detector on every Nth frame and reuse its boxes in between (default: 3)'
+    )
+    parser.add_argument(
+        '--batch',
+        type=int,
+        default=16,
+        help='Frames per inference batch for video files (default: 16)'
+    )
     
     args = parser.parse_args()
     
     # Load YOLOv8n model
-    print("Loading YOLOv8n model...")
-    model = YOLO('yolov8n.pt')  # This will automatically download if not present
+    onnx = args.runtime == 'onnx' and not args.engine
+    if args.engine:
+        print(f"Loading YOLOv8n TensorRT engine ({args.engine.upper()})...")
+        model = load_engine(args.engine, imgsz=args.imgsz)
+    elif onnx:
+        print("Loading YOLOv8n ONNX model...")
+        model = load_onnx(imgsz=args.imgsz)
+    else:
+        print("Loading YOLOv8n model...")
+        model = YOLO('yolov8n.pt')  # This will automatically download if not present
+    
+    # FP16 inference on CUDA GPUs; exported models already have their precision baked in
+    half = torch.cuda.is_available() and not args.engine and not onnx
+    
+    # torch.compile applies to the PyTorch model only; for the webcam it happens in
+    # run_webcam, once the capture shape is known
+    torch_compile = args.compile and not args.engine and not onnx
+    if torch_compile and args.source != '0':
+        model = compile_model(model, imgsz=args.imgsz, half=half)
     
     # Check if source is webcam
     if args.source == '0':
-        run_webcam(model, conf=args.conf)
+        run_webcam(
+            model,
+            conf=args.conf,
+            imgsz=args.imgsz,
+            infer_every=max(1, args.infer_every),
+            half=half,
+            gpu_upload=not onnx,
+            torch_compile=torch_compile
+        )
+    elif Path(args.source).suffix.lower() in VIDEO_SUFFIXES:
+        # Exported TensorRT engines and ONNX models have a fixed batch size of 1
+        batch = 1 if args.engine or onnx else args.batch
+        print(f"Running detection on: {args.source} (batch size {batch})")
+        run_video(
+            model,
+            args.source,
+            conf=args.conf,
+            imgsz=args.imgsz,
+            batch=batch,
+            save=args.save,
+            output_dir=args.output_dir,
+            half=half
+        )
+        
+        print(f"\nDetection complete!")
+        if args.save:
+            print(f"Results saved to: {args.output_dir}")
     else:
-        # Run inference on image/video
+        # Run inference on image
         print(f"Running detection on: {args.source}")
         results = model.predict(
             source=args.source,
             conf=args.conf,
+            imgsz=args.imgsz,
+            half=half,
             save=args.save,
             show=True,
             project=args.output_dir
@@ -151,17 +485,7 @@ def main():
         
         # Process results
         for result in results:
-            boxes = result.boxes
-            
-            if len(boxes) > 0:
-                print(f"\nDetected {len(boxes)} objects:")
-                for box in boxes:
-                    cls = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    class_name = model.names[cls]
-                    print(f"  - {class_name}: {conf:.2f}")
-            else:
-                print("No objects detected")
+            print_detections(result, model.names)
         
         print(f"\nDetection complete!")
         if args.save:
@@ -12,6 +12,10 @@ from pathlib import Path
 # Web app base URL
 BASE_URL = "http://localhost:5001"
 
+# Shared keep-alive session so repeated status polls reuse one TCP connection
+SESSION = requests.Session()
+SESSION.mount('http://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4))
+
 def test_web_app():
     """Test the web application endpoints."""
     print("🧪 Testing YOLOv8 Web Application")
@@ -20,7 +24,7 @@ def test_web_app():
     # Test 1: Check if server is running
     print("\n1. Testing server connection...")
     try:
-        response = requests.get(f"{BASE_URL}/")
+        response = SESSION.get(f"{BASE_URL}/")
         if response.status_code == 200:
             print("✅ Server is running")
         else:
@@ -34,7 +38,7 @@ def test_web_app():
     # Test 2: Get available cameras
     print("\n2. Getting available cameras...")
     try:
-        response = requests.get(f"{BASE_URL}/api/cameras")
+        response = SESSION.get(f"{BASE_URL}/api/cameras")
         data = response.json()
         if 'cameras' in data:
             cameras = data['cameras']
@@ -50,7 +54,7 @@ def test_web_app():
     # Test 3: Get configuration
     print("\n3. Getting configuration...")
     try:
-        response = requests.get(f"{BASE_URL}/api/config")
+        response = SESSION.get(f"{BASE_URL}/api/config")
         data = response.json()
         print("✅ Configuration:")
         print(f"   - Model: {data.get('model_path', 'Unknown')}")
@@ -63,7 +67,7 @@ def test_web_app():
     # Test 4: Get status
     print("\n4. Getting processing status...")
     try:
-        response = requests.get(f"{BASE_URL}/api/status")
+        response = SESSION.get(f"{BASE_URL}/api/status")
         data = response.json()
         print("✅ Status:")
         print(f"   - Processing: {data.get('is_processing', False)}")
@@ -88,7 +92,7 @@ def demo_camera_processing():
     
     # Start camera processing
     try:
-        response = requests.post(f"{BASE_URL}/api/start_camera", json={
+        response = SESSION.post(f"{BASE_URL}/api/start_camera", json={
             'camera_index': 0,
             'confidence': 0.25,
             'enable_tracking': True
@@ -102,13 +106,13 @@ def demo_camera_processing():
             print("📊 Monitoring processing for 10 seconds...")
             for i in range(10):
                 time.sleep(1)
-                status_response = requests.get(f"{BASE_URL}/api/status")
+                status_response = SESSION.get(f"{BASE_URL}/api/status")
                 status_data = status_response.json()
                 stats = status_data.get('stats', {})
                 print(f"   Frame {stats.get('total_frames', 0)}: {stats.get('total_detections', 0)} detections")
             
             # Stop processing
-            stop_response = requests.post(f"{BASE_URL}/api/stop_processing")
+            stop_response = SESSION.post(f"{BASE_URL}/api/stop_processing")
             if stop_response.json().get('status') == 'stopped':
                 print("✅ Camera processing stopped")
             
@@ -150,7 +154,7 @@ def demo_video_upload():
                 'enable_tracking': 'true'
             }
             
-            response = requests.post(f"{BASE_URL}/api/upload_video", files=files, data=data)
+            response = SESSION.post(f"{BASE_URL}/api/upload_video", files=files, data=data)
             result = response.json()
             
             if result.get('status') == 'started':
@@ -160,7 +164,7 @@ def demo_video_upload():
                 print("📊 Monitoring video processing...")
                 for i in range(15):  # Monitor for 15 seconds
                     time.sleep(1)
-                    status_response = requests.get(f"{BASE_URL}/api/status")
+                    status_response = SESSION.get(f"{BASE_URL}/api/status")
                     status_data = status_response.json()
                     stats = status_data.get('stats', {})
                     print(f"   Frame {stats.get('total_frames', 0)}: {stats.get('total_detections', 0)} detections")
@@ -172,7 +176,7 @@ def demo_video_upload():
                 
                 # Stop processing if still running
                 if status_data.get('is_processing', False):
-                    stop_response = requests.post(f"{BASE_URL}/api/stop_processing")
+                    stop_response = SESSION.post(f"{BASE_URL}/api/stop_processing")
                     if stop_response.json().get('status') == 'stopped':
                         print("✅ Video processing stopped")
             else:
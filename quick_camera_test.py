@@ -5,17 +5,23 @@ Simple version to test camera functionality with improved detection
 """
 
 import cv2
+import sys
 import numpy as np
 import time
 import os
 from improved_image_matcher import ImprovedImageMatcher
 
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from camera_handler import configure_capture, get_capture_backend
+
 def test_camera():
     """Test camera and basic detection"""
     print("🎥 Testing camera access...")
     
     # Try to open camera
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(0, get_capture_backend())
+    configure_capture(cap)
     if not cap.isOpened():
         return False
     
@@ -49,7 +55,8 @@ def run_simple_detection():
         return
     
     # Open camera
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(0, get_capture_backend())
+    configure_capture(cap)
     if not cap.isOpened():
         print("❌ Cannot open camera")
         return
@@ -58,6 +65,9 @@ def run_simple_detection():
     paused = False
     last_detection_time = 0
     detection_results = []
+    # Reused across frames instead of copying into a fresh array every iteration
+    display_frame = None
+    instructions = None
     
     try:
         while True:
@@ -69,7 +79,15 @@ def run_simple_detection():
                 frame_count += 1
                 
                 # Simple display with frame info
-                display_frame = frame.copy()
+                if display_frame is None or display_frame.shape != frame.shape:
+                    display_frame = np.empty_like(frame)
+                    # The instructions never change, so render them once into an overlay
+                    instructions = np.zeros_like(frame)
+                    cv2.putText(instructions, "Press 'd' to detect, 'r' to record", 
+                               (10, instructions.shape[0] - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                    cv2.putText(instructions, "Press 'q' to quit, 's' for screenshot", 
+                               (10, instructions.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                np.copyto(display_frame, frame)
                 
                 # Add frame counter
                 cv2.putText(display_frame, f"Frame: {frame_count}", 
@@ -104,10 +122,7 @@ def run_simple_detection():
                             cv2.rectangle(display_frame, (x, y), (x + w, y + h), color, 3)
                 
                 # Add instructions
-                cv2.putText(display_frame, "Press 'd' to detect, 'r' to record", 
-                           (10, display_frame.shape[0] - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                cv2.putText(display_frame, "Press 'q' to quit, 's' for screenshot", 
-                           (10, display_frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                cv2.add(display_frame, instructions, dst=display_frame)
                 
                 cv2.imshow('Quick Camera Test - Improved Detection', display_frame)
             
@@ -6,38 +6,157 @@ Uses face detection and recognition to create vector embeddings and enable simil
 
 import os
 import json
+import itertools
+import multiprocessing
 import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
 import cv2
+import dlib
 import face_recognition
+from face_recognition import api as face_api
 from pathlib import Path
 import logging
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
 import sqlite3
+import threading
+from collections import defaultdict
 from datetime import datetime
 import shutil
+from image_decode import decode_image, decode_to_shared_memory, release_shared_memory
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# dlib face encodings are 128-dimensional
+EMBEDDING_DIM = 128
+# The int8 first pass shortlists this many candidates per requested result for exact rescoring
+RESCORE_FACTOR = 4
+# Past this many faces the first pass compares sign bits (16 bytes per face) instead of int8 codes,
+# keeping more candidates per result since Hamming distance is a coarser estimate
+BINARY_PREFILTER_MIN_ROWS = 100_000
+BINARY_RESCORE_FACTOR = 10
+# Whether this process has already run the face networks once (see _warm_up_models)
+_models_warm = False
+# Set bits in every byte value, for popcounting XORed sign codes
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+# HOG runs on a half-size copy of images at least this large; its cost is linear in pixels
+HOG_DOWNSCALE_MIN_SIDE = 400
+# HNSW graph parameters; the index grows past the initial capacity as faces are added
+HNSW_INITIAL_CAPACITY = 100_000
+HNSW_EF_CONSTRUCTION = 200
+HNSW_M = 16
+HNSW_EF_SEARCH = 64
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length as float32, so squared distance is 2 - 2 * dot product"""
+    vectors = np.atleast_2d(vectors).astype(np.float32)
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization, returning (codes, scales) with vectors ~= codes * scales"""
+    vectors = np.atleast_2d(vectors).astype(np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.round(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+load_image = decode_image
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _int8_scores(codes, query_codes, scales):
+        """Per-row int8 dot products with int32 accumulators, scaled back to float32"""
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for i in prange(codes.shape[0]):
+            acc = np.int32(0)
+            for j in range(codes.shape[1]):
+                acc += np.int32(codes[i, j]) * np.int32(query_codes[j])
+            out[i] = acc * scales[i]
+        return out
+else:
+    _int8_scores = None
+
+def _warm_up_models():
+    """Run the HOG detector and face encoder once per process so the first search doesn't pay their setup"""
+    global _models_warm
+    if _models_warm:
+        return
+    blank = np.zeros((64, 64, 3), dtype=np.uint8)
+    face_recognition.face_locations(blank, model="hog")
+    face_recognition.face_encodings(blank, known_face_locations=[(0, 64, 64, 0)])
+    _models_warm = True
+
+def _detect_one(image_path: str) -> Tuple[str, List[np.ndarray], List[Tuple]]:
+    """Pool worker: detect and encode the faces in one image"""
+    face_encodings, face_locations = FaceVectorDatabase.detect_and_encode_faces(image_path)
+    return image_path, face_encodings, face_locations
+
 class FaceVectorDatabase:
-    def __init__(self, db_path: str = "face_vector_db.db", images_dir: str = "sex-offenders/images"):
+    def __init__(self, db_path: str = "face_vector_db.db", images_dir: str = "sex-offenders/images",
+                 use_cnn: Optional[bool] = None):
         self.db_path = db_path
         self.images_dir = Path(images_dir)
+        # Bulk processing uses dlib's CNN detector in GPU batches when dlib was built with CUDA
+        self.use_cnn = dlib.DLIB_USE_CUDA if use_cnn is None else use_cnn
         self.embeddings_dir = Path("face_embeddings")
         self.embeddings_dir.mkdir(exist_ok=True)
+        # Approximate nearest-neighbour graph over the unit-length encodings, labelled by
+        # face_embeddings.id (needs hnswlib)
+        self.index_path = self.embeddings_dir / "faces.hnsw"
+        self._hnsw = None
+        
+        # Stacked primary encodings for search, built lazily by _load_all_embeddings()
+        self._matrix: Optional[np.ndarray] = None
+        self._rows: List[Tuple[str, str, str]] = []  # (offender_id, name, image_path) per matrix row
+        self._ids: Optional[np.ndarray] = None  # face_embeddings.id of each matrix row
+        # int8 copy of the matrix for the approximate first search pass
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        # Packed sign bits of the matrix, (N, 16) uint8, for the binary first pass
+        self._bits: Optional[np.ndarray] = None
+        
+        # One SQLite connection per thread, reused across queries (see _conn)
+        self._tls = threading.local()
+        self._name_fts = False
         
         # Initialize database
         self.init_database()
         
-        # Load offender data
-        self.offender_data = self.load_offender_data()
+        # Copy offender names into SQLite so lookups don't need the JSON in memory
+        self.load_offender_data()
+        
+        _warm_up_models()
+    
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's database connection, opening it in WAL mode on first use"""
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA cache_size=-65536')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            # INSERT OR REPLACE must fire the delete trigger that keeps name_fts in sync
+            conn.execute('PRAGMA recursive_triggers=ON')
+            self._tls.conn = conn
+        return conn
     
     def init_database(self):
         """Initialize SQLite database for storing face embeddings and metadata"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn().cursor()
         
         # Create tables
         cursor.execute('''
@@ -49,11 +168,38 @@ class FaceVectorDatabase:
                 embedding_path TEXT NOT NULL,
                 face_count INTEGER DEFAULT 0,
                 face_locations TEXT,
+                embedding BLOB,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
+        # Databases from when encodings lived in files lack the embedding column
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(face_embeddings)')]
+        if 'embedding' not in columns:
+            cursor.execute('ALTER TABLE face_embeddings ADD COLUMN embedding BLOB')
+        
+        # Rows whose encodings are still in embedding files are copied into the database
+        # once, here rather than on first search, which can run inside an ingest transaction
+        cursor.execute('SELECT offender_id, embedding_path FROM face_embeddings WHERE embedding IS NULL')
+        for offender_id, embedding_path in cursor.fetchall():
+            try:
+                encodings = self.read_embedding_file(embedding_path)['all_encodings']
+                cursor.execute('UPDATE face_embeddings SET embedding = ? WHERE offender_id = ?',
+                               (np.asarray(encodings, dtype=np.float32).tobytes(), offender_id))
+            except Exception as e:
+                logger.error(f"Error loading embedding for {offender_id}: {e}")
+        
+        # Covering index for the name-ordered listings: rows come back already sorted
+        # and straight from the index pages, without touching the embedding BLOBs
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_name_cover'")
+        if not cursor.fetchone():
+            cursor.execute('''
+                CREATE INDEX idx_name_cover
+                ON face_embeddings(name, offender_id, image_path, face_count, created_at)
+            ''')
+            cursor.execute('ANALYZE face_embeddings')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS search_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -64,13 +210,66 @@ class FaceVectorDatabase:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS offender_meta (
+                offender_id TEXT PRIMARY KEY,
+                name TEXT,
+                raw TEXT
+            )
+        ''')
+        
+        self._name_fts = self._init_name_index(cursor)
+        
+        # Records which offender data file offender_meta was loaded from
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        
+        self._conn().commit()
         logger.info("Database initialized successfully")
     
-    def load_offender_data(self) -> Dict[str, Dict]:
-        """Load offender data from JSON files"""
-        offender_data = {}
+    def _init_name_index(self, cursor) -> bool:
+        """Create the trigram full-text index over face_embeddings.name, returning False if SQLite lacks it"""
+        try:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'name_fts'")
+            if cursor.fetchone():
+                return True
+            
+            # External-content table: the names stay in face_embeddings, triggers keep the index current
+            cursor.execute("""
+                CREATE VIRTUAL TABLE name_fts USING fts5(
+                    name, content='face_embeddings', content_rowid='id', tokenize='trigram'
+                )
+            """)
+            cursor.execute("""
+                CREATE TRIGGER name_fts_insert AFTER INSERT ON face_embeddings BEGIN
+                    INSERT INTO name_fts(rowid, name) VALUES (new.id, new.name);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER name_fts_delete AFTER DELETE ON face_embeddings BEGIN
+                    INSERT INTO name_fts(name_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER name_fts_update AFTER UPDATE OF name ON face_embeddings BEGIN
+                    INSERT INTO name_fts(name_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                    INSERT INTO name_fts(rowid, name) VALUES (new.id, new.name);
+                END
+            """)
+            cursor.execute("INSERT INTO name_fts(name_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError as e:
+            # FTS5's trigram tokenizer needs SQLite 3.34+
+            logger.warning(f"Name index unavailable, name search will scan: {e}")
+            return False
+    
+    def load_offender_data(self) -> int:
+        """Load offender data from JSON files into the offender_meta table, if it changed since the last load"""
+        cursor = self._conn().cursor()
         
         # Try to load from the most recent data file
         data_files = [
@@ -80,30 +279,57 @@ class FaceVectorDatabase:
         
         for data_file in data_files:
             if Path(data_file).exists():
+                source = f"{data_file}:{Path(data_file).stat().st_mtime_ns}"
+                cursor.execute("SELECT value FROM settings WHERE key = 'offender_source'")
+                loaded = cursor.fetchone()
+                if loaded and loaded[0] == source:
+                    return 0
+                
                 try:
                     with open(data_file, 'r', encoding='utf-8') as f:
                         data = json.load(f)
                     
-                    for offender in data:
-                        offender_id = offender.get('offender_id')
-                        if offender_id:
-                            offender_data[offender_id] = offender
+                    rows = [
+                        (offender['offender_id'], offender.get('name', 'Unknown'), json.dumps(offender, ensure_ascii=False))
+                        for offender in data if offender.get('offender_id')
+                    ]
+                    cursor.execute('DELETE FROM offender_meta')
+                    cursor.executemany('INSERT OR REPLACE INTO offender_meta (offender_id, name, raw) VALUES (?, ?, ?)', rows)
+                    cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('offender_source', ?)", (source,))
+                    self._conn().commit()
                     
-                    logger.info(f"Loaded {len(offender_data)} offenders from {data_file}")
-                    break
+                    logger.info(f"Loaded {len(rows)} offenders from {data_file}")
+                    return len(rows)
                 except Exception as e:
+                    self._conn().rollback()
                     logger.error(f"Error loading {data_file}: {e}")
         
-        return offender_data
+        return 0
+    
+    def get_offender_name(self, offender_id: str) -> str:
+        """Look up an offender's name from the loaded offender data"""
+        cursor = self._conn().cursor()
+        cursor.execute('SELECT name FROM offender_meta WHERE offender_id = ?', (offender_id,))
+        result = cursor.fetchone()
+        return result[0] if result and result[0] else "Unknown"
     
-    def detect_and_encode_faces(self, image_path: str) -> Tuple[List[np.ndarray], List[Tuple]]:
+    @staticmethod
+    def detect_and_encode_faces(image_path: str) -> Tuple[List[np.ndarray], List[Tuple]]:
         """Detect faces in image and return encodings and locations"""
         try:
             # Load image
-            image = face_recognition.load_image_file(image_path)
+            image = load_image(image_path)
             
-            # Find face locations
-            face_locations = face_recognition.face_locations(image, model="hog")
+            # Find face locations on a half-size copy, then map the boxes back to
+            # full resolution so encodings still see the original pixels
+            if min(image.shape[:2]) >= HOG_DOWNSCALE_MIN_SIDE:
+                small = cv2.resize(image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+                face_locations = [
+                    (top * 2, right * 2, bottom * 2, left * 2)
+                    for top, right, bottom, left in face_recognition.face_locations(small, model="hog")
+                ]
+            else:
+                face_locations = face_recognition.face_locations(image, model="hog")
             
             if not face_locations:
                 logger.warning(f"No faces detected in {image_path}")
@@ -119,28 +345,74 @@ class FaceVectorDatabase:
             logger.error(f"Error processing {image_path}: {e}")
             return [], []
     
-    def save_embedding(self, offender_id: str, face_encodings: List[np.ndarray], face_locations: List[Tuple]):
-        """Save face embeddings to file"""
-        if not face_encodings:
-            return None
-        
-        # Use the first face encoding as the primary one
-        primary_encoding = face_encodings[0]
+    @staticmethod
+    def read_embedding_file(embedding_path: str) -> Dict:
+        """Read an embedding file written before encodings were stored in the database"""
+        if embedding_path.endswith('.pkl'):
+            # Written before embeddings were stored as .npy
+            with open(embedding_path, 'rb') as f:
+                return pickle.load(f)
         
-        embedding_path = self.embeddings_dir / f"{offender_id}.pkl"
+        encodings = np.load(embedding_path, mmap_mode='r')
+        with open(embedding_path[:-len('.enc.npy')] + '.loc.json', 'r', encoding='utf-8') as f:
+            face_locations = [tuple(location) for location in json.load(f)]
         
-        embedding_data = {
-            'offender_id': offender_id,
-            'primary_encoding': primary_encoding,
-            'all_encodings': face_encodings,
+        return {
+            'offender_id': Path(embedding_path).name[:-len('.enc.npy')],
+            'primary_encoding': encodings[0],
+            'all_encodings': encodings,
             'face_locations': face_locations,
-            'face_count': len(face_encodings)
+            'face_count': len(encodings)
         }
-        
-        with open(embedding_path, 'wb') as f:
-            pickle.dump(embedding_data, f)
-        
-        return str(embedding_path)
+    
+    def _get_hnsw(self):
+        """Load (or build) the HNSW index over the embedding matrix, or None without hnswlib"""
+        if hnswlib is None:
+            return None
+        if self._hnsw is not None:
+            return self._hnsw
+        
+        matrix = self._load_all_embeddings()
+        index = hnswlib.Index(space='l2', dim=EMBEDDING_DIM)
+        if self.index_path.exists():
+            index.load_index(str(self.index_path), max_elements=max(HNSW_INITIAL_CAPACITY, 2 * len(matrix)))
+            indexed = set(index.get_ids_list())
+        else:
+            index.init_index(max_elements=max(HNSW_INITIAL_CAPACITY, 2 * len(matrix)),
+                             ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+            indexed = set()
+        
+        # Bring a saved index up to date with the database: add rows stored since it
+        # was written and drop rows that re-processing replaced
+        live = set(self._ids.tolist())
+        missing = [i for i, face_id in enumerate(self._ids) if face_id not in indexed]
+        if missing:
+            index.add_items(matrix[missing], self._ids[missing])
+        for face_id in indexed - live:
+            try:
+                index.mark_deleted(face_id)
+            except RuntimeError:
+                pass  # already marked in a previous session
+        
+        index.set_ef(HNSW_EF_SEARCH)
+        self._hnsw = index
+        if missing or not self.index_path.exists():
+            self.save_index()
+        return index
+    
+    def add_to_index(self, encoding: np.ndarray, face_id: int):
+        """Insert a primary encoding into the HNSW index under its face_embeddings.id"""
+        index = self._get_hnsw()
+        if index is None:
+            return
+        if index.get_current_count() >= index.get_max_elements():
+            index.resize_index(2 * index.get_max_elements())
+        index.add_items(normalize_rows(encoding), [face_id])
+    
+    def save_index(self):
+        """Write the HNSW index to the embeddings directory"""
+        if self._hnsw is not None:
+            self._hnsw.save_index(str(self.index_path))
     
     def process_image(self, image_path: str, offender_id: str = None) -> bool:
         """Process a single image and store face embeddings"""
@@ -156,31 +428,34 @@ class FaceVectorDatabase:
             
             # Detect and encode faces
             face_encodings, face_locations = self.detect_and_encode_faces(image_path)
+            return self.store_faces(image_path, offender_id, face_encodings, face_locations)
             
+        except Exception as e:
+            logger.error(f"Error processing image {image_path}: {e}")
+            return False
+    
+    def store_faces(self, image_path: str, offender_id: str, face_encodings: List[np.ndarray],
+                    face_locations: List[Tuple], commit: bool = True) -> bool:
+        """Store the detected faces of one image as that offender's embeddings"""
+        try:
             if not face_encodings:
                 logger.warning(f"No faces found in {image_path}")
                 return False
             
-            # Save embeddings
-            embedding_path = self.save_embedding(offender_id, face_encodings, face_locations)
-            
-            if not embedding_path:
-                return False
-            
             # Get offender name
-            name = "Unknown"
-            if offender_id in self.offender_data:
-                name = self.offender_data[offender_id].get('name', 'Unknown')
+            name = self.get_offender_name(offender_id)
             
-            # Store in database
-            self.store_in_database(
+            # Store in database, with every encoding (primary face first) as raw float32 bytes
+            face_id = self.store_in_database(
                 offender_id=offender_id,
                 name=name,
                 image_path=str(image_path),
-                embedding_path=embedding_path,
+                embedding=np.asarray(face_encodings, dtype=np.float32).tobytes(),
                 face_count=len(face_encodings),
-                face_locations=face_locations
+                face_locations=face_locations,
+                commit=commit
             )
+            self.add_to_index(face_encodings[0], face_id)
             
             logger.info(f"Successfully processed {name} (ID: {offender_id})")
             return True
@@ -190,77 +465,250 @@ class FaceVectorDatabase:
             return False
     
     def store_in_database(self, offender_id: str, name: str, image_path: str, 
-                         embedding_path: str, face_count: int, face_locations: List[Tuple]):
-        """Store face embedding metadata in database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+                         embedding: bytes, face_count: int, face_locations: List[Tuple],
+                         commit: bool = True) -> int:
+        """Store face embeddings and metadata in database, returning the row id; commit=False leaves the row in the open transaction"""
+        cursor = self._conn().cursor()
         
         # Convert face locations to string for storage
         face_locations_str = json.dumps(face_locations)
         
         cursor.execute('''
             INSERT OR REPLACE INTO face_embeddings 
-            (offender_id, name, image_path, embedding_path, face_count, face_locations, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (offender_id, name, image_path, embedding_path, face_count, face_locations_str))
+            (offender_id, name, image_path, embedding_path, face_count, face_locations, embedding, updated_at)
+            VALUES (?, ?, ?, '', ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (offender_id, name, image_path, face_count, face_locations_str, embedding))
         
-        conn.commit()
-        conn.close()
+        if commit:
+            self._conn().commit()
+        
+        # The search matrix is stale now
+        self._matrix = None
+        return cursor.lastrowid
     
     def is_processed(self, offender_id: str) -> bool:
         """Check if an offender's image has already been processed"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn().cursor()
         
         cursor.execute('SELECT COUNT(*) FROM face_embeddings WHERE offender_id = ?', (offender_id,))
         count = cursor.fetchone()[0]
         
-        conn.close()
         return count > 0
     
-    def process_all_images(self) -> Dict[str, bool]:
-        """Process all images in the images directory"""
+    def process_all_images(self, workers: Optional[int] = None) -> Dict[str, bool]:
+        """Process all images in the images directory, detecting faces on all CPU cores"""
         if not self.images_dir.exists():
             logger.error(f"Images directory {self.images_dir} does not exist")
             return {}
         
         results = {}
-        image_files = list(self.images_dir.glob("*.jpg")) + list(self.images_dir.glob("*.png"))
+        logger.info(f"Processing images in {self.images_dir}...")
+        
+        # One query for every processed ID instead of one is_processed() call per image
+        cursor = self._conn().cursor()
+        cursor.execute('SELECT offender_id FROM face_embeddings')
+        processed_ids = {row[0] for row in cursor.fetchall()}
         
-        logger.info(f"Processing {len(image_files)} images...")
+        # The directory is listed lazily, so detection starts on the first images
+        # while the rest are still being enumerated
+        pending = self._unprocessed_images(processed_ids, results)
+        first = next(pending, None)
+        pending = itertools.chain([first], pending) if first else None
         
-        for image_path in image_files:
-            offender_id = image_path.stem
-            success = self.process_image(str(image_path), offender_id)
-            results[offender_id] = success
+        # All rows go into one transaction, committed (one fsync) once the batch ends
+        try:
+            if pending and self.use_cnn:
+                for image_path, face_encodings, face_locations in self._detect_batches_cnn(pending, workers=workers):
+                    offender_id = Path(image_path).stem
+                    results[offender_id] = self.store_faces(image_path, offender_id, face_encodings, face_locations,
+                                                            commit=False)
+            elif pending:
+                # Face detection is CPU-bound and independent per image, so it runs in a pool;
+                # results are stored here because SQLite has a single writer. Spawned workers
+                # import dlib themselves instead of inheriting it across fork().
+                with multiprocessing.get_context('spawn').Pool(workers or os.cpu_count()) as pool:
+                    for image_path, face_encodings, face_locations in pool.imap_unordered(_detect_one, pending, chunksize=4):
+                        offender_id = Path(image_path).stem
+                        results[offender_id] = self.store_faces(image_path, offender_id, face_encodings, face_locations,
+                                                                commit=False)
+        finally:
+            self._conn().commit()
+        
+        self.save_index()
         
         successful = sum(1 for success in results.values() if success)
-        logger.info(f"Successfully processed {successful}/{len(image_files)} images")
+        logger.info(f"Successfully processed {successful}/{len(results)} images")
         
         return results
     
+    def _unprocessed_images(self, processed_ids: set, results: Dict[str, bool]) -> Iterator[str]:
+        """Yield the paths of images not yet in the database, marking the others as done in results"""
+        with os.scandir(self.images_dir) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(('.jpg', '.png')) or not entry.is_file():
+                    continue
+                offender_id = Path(entry.name).stem
+                if offender_id in processed_ids:
+                    logger.info(f"Image {offender_id} already processed, skipping")
+                    results[offender_id] = True
+                else:
+                    yield entry.path
+    
+    def _detect_batches_cnn(self, image_paths: Iterable[str], batch_size: int = 32, workers: Optional[int] = None):
+        """Yield (image_path, encodings, locations) for each image, detecting faces with dlib's CNN in batches"""
+        image_paths = iter(image_paths)
+        
+        # Worker processes decode images straight into shared memory and hand back only
+        # the block name, so the parent never unpickles full-size pixel arrays. The worker
+        # lives in image_decode so spawned processes import just OpenCV and NumPy; decoding
+        # only has to keep one GPU batch ahead, so a few workers are enough.
+        workers = workers or min(4, os.cpu_count() or 1)
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            def submit_chunk():
+                return [pool.submit(decode_to_shared_memory, image_path)
+                        for image_path in itertools.islice(image_paths, batch_size)]
+            
+            upcoming = submit_chunk()
+            try:
+                while upcoming:
+                    decoded = [future.result() for future in upcoming]
+                    # Decode the next chunk while this one is on the GPU
+                    upcoming = submit_chunk()
+                    yield from self._detect_decoded_cnn(decoded)
+            finally:
+                # On an early exit or error the prefetched chunk is never consumed, so its
+                # blocks are unlinked here rather than leaking in /dev/shm
+                for future in upcoming:
+                    if not future.cancel():
+                        try:
+                            release_shared_memory(future.result()[1])
+                        except Exception as e:
+                            logger.warning(f"Could not release a prefetched image: {e}")
+    
+    def _detect_decoded_cnn(self, decoded: List[Tuple]):
+        """Detect faces in one chunk of shared-memory images, releasing the blocks afterwards"""
+        # dlib can only batch images of identical size, so group the chunk by shape
+        by_shape = defaultdict(list)
+        failed = []
+        for image_path, shm_name, shape, dtype in decoded:
+            if shm_name is None:
+                failed.append(image_path)
+            else:
+                by_shape[shape].append((image_path, shared_memory.SharedMemory(name=shm_name), shape, dtype))
+        
+        try:
+            for image_path in failed:
+                yield image_path, [], []
+            for group in by_shape.values():
+                yield from self._detect_group_cnn(group)
+        finally:
+            for blocks in by_shape.values():
+                for _, shm, _, _ in blocks:
+                    shm.close()
+                    shm.unlink()
+    
+    @staticmethod
+    def _detect_group_cnn(group: List[Tuple]) -> List[Tuple[str, List[np.ndarray], List[Tuple]]]:
+        """Detect and encode faces in same-shaped shared-memory images with one dlib call for each step"""
+        # The arrays are views on the shared blocks; they go out of scope on return so
+        # the blocks can be closed
+        images = [np.ndarray(shape, dtype=dtype, buffer=shm.buf) for _, shm, shape, dtype in group]
+        all_locations = face_recognition.batch_face_locations(
+            images, number_of_times_to_upsample=0, batch_size=len(images)
+        )
+        
+        # Landmarks per face, then every face of the batch through the encoder network in
+        # a single compute_face_descriptor call rather than one face_encodings call per image
+        with_faces = [i for i, face_locations in enumerate(all_locations) if face_locations]
+        batch_landmarks = []
+        for i in with_faces:
+            landmarks = dlib.full_object_detections()
+            for top, right, bottom, left in all_locations[i]:
+                landmarks.append(face_api.pose_predictor_5_point(images[i], dlib.rectangle(left, top, right, bottom)))
+            batch_landmarks.append(landmarks)
+        descriptors = face_api.face_encoder.compute_face_descriptor(
+            [images[i] for i in with_faces], batch_landmarks, 1
+        ) if with_faces else []
+        encodings_by_image = {i: [np.array(d) for d in image_descriptors] for i, image_descriptors in zip(with_faces, descriptors)}
+        
+        results = []
+        for i, ((image_path, *_), face_locations) in enumerate(zip(group, all_locations)):
+            face_encodings = encodings_by_image.get(i, [])
+            logger.info(f"Detected {len(face_encodings)} faces in {image_path}")
+            results.append((image_path, face_encodings, face_locations))
+        return results
+    
     def load_embedding(self, offender_id: str) -> Optional[Dict]:
         """Load face embedding for a specific offender"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn().cursor()
         
-        cursor.execute('SELECT embedding_path FROM face_embeddings WHERE offender_id = ?', (offender_id,))
+        cursor.execute('''
+            SELECT embedding, face_locations, embedding_path FROM face_embeddings WHERE offender_id = ?
+        ''', (offender_id,))
         result = cursor.fetchone()
         
-        conn.close()
-        
         if not result:
             return None
         
-        embedding_path = result[0]
+        embedding, face_locations, embedding_path = result
         
         try:
-            with open(embedding_path, 'rb') as f:
-                return pickle.load(f)
+            if embedding is None:
+                return self.read_embedding_file(embedding_path)
+            
+            encodings = np.frombuffer(embedding, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+            return {
+                'offender_id': offender_id,
+                'primary_encoding': encodings[0],
+                'all_encodings': encodings,
+                'face_locations': [tuple(location) for location in json.loads(face_locations or '[]')],
+                'face_count': len(encodings)
+            }
         except Exception as e:
             logger.error(f"Error loading embedding for {offender_id}: {e}")
             return None
     
+    def _load_all_embeddings(self) -> np.ndarray:
+        """Load every stored primary encoding into one (N, 128) matrix, cached until the next insert"""
+        if self._matrix is not None:
+            return self._matrix
+        
+        cursor = self._conn().cursor()
+        
+        # One sequential read of every primary encoding (the first 128 floats of each BLOB)
+        cursor.execute('''
+            SELECT id, offender_id, name, image_path, substr(embedding, 1, ?) FROM face_embeddings
+            WHERE embedding IS NOT NULL
+        ''', (EMBEDDING_DIM * 4,))
+        results = cursor.fetchall()
+        
+        if not results:
+            self._matrix = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+            self._rows = []
+            self._ids = np.empty(0, dtype=np.int64)
+        else:
+            self._ids = np.array([face_id for face_id, *_ in results], dtype=np.int64)
+            self._rows = [(offender_id, name, image_path) for _, offender_id, name, image_path, _ in results]
+            stored = np.frombuffer(b''.join(primary for *_, primary in results), dtype=np.float32)
+            self._matrix = normalize_rows(stored.reshape(-1, EMBEDDING_DIM))
+        
+        self._codes, self._scales = quantize_int8(self._matrix)
+        self._bits = np.packbits(self._matrix > 0, axis=1)
+        return self._matrix
+    
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Dot products of the unit-length query with every stored face, estimated from the int8 codes"""
+        query_codes, query_scales = quantize_int8(query)
+        if _int8_scores is not None:
+            # Compiled kernel reads the int8 codes directly instead of NumPy's int32 upcast
+            return _int8_scores(self._codes, query_codes[0], self._scales) * query_scales[0]
+        return (self._codes @ query_codes[0].astype(np.int32)) * self._scales * query_scales[0]
+    
+    def _hamming_distances(self, query: np.ndarray) -> np.ndarray:
+        """Number of differing sign bits between the query and every stored face"""
+        query_bits = np.packbits(query > 0)
+        return POPCOUNT_TABLE[self._bits ^ query_bits].sum(axis=1, dtype=np.uint16)
+    
     def search_by_face(self, query_image_path: str, top_k: int = 5, tolerance: float = 0.6) -> List[Dict]:
         """Search for similar faces using a query image"""
         try:
@@ -273,70 +721,125 @@ class FaceVectorDatabase:
             
             query_encoding = query_encodings[0]  # Use first face
             
-            # Get all stored embeddings
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            query = normalize_rows(query_encoding)[0]
             
-            cursor.execute('SELECT offender_id, name, image_path, embedding_path FROM face_embeddings')
-            results = cursor.fetchall()
+            index = self._get_hnsw()
+            if index is not None and index.get_current_count() > 0:
+                similarities = self._search_hnsw(index, query, top_k, tolerance)
+                self.log_search('face_search', query_image_path, len(similarities))
+                return similarities
             
-            conn.close()
+            matrix = self._load_all_embeddings()
+            shortlist = RESCORE_FACTOR * top_k
+            # For unit-length encodings ||a - b||^2 = 2 - 2 a.b, so the distance tolerance
+            # becomes a minimum dot product and ranking needs only one matrix-vector product
+            min_score = 1 - tolerance ** 2 / 2
             
-            similarities = []
+            if len(matrix) > BINARY_PREFILTER_MIN_ROWS:
+                # Very large databases: scan only the sign bits first
+                shortlist = BINARY_RESCORE_FACTOR * top_k
+                candidates = np.argpartition(self._hamming_distances(query), shortlist)[:shortlist]
+                match_count = None
+            elif len(matrix) > shortlist:
+                # First pass over the int8 codes (a quarter of the bytes of float32), keeping
+                # the closest candidates without sorting the rest
+                approx = self._approximate_scores(query)
+                match_count = int(np.count_nonzero(approx >= min_score))
+                candidates = np.argpartition(-approx, shortlist)[:shortlist]
+            else:
+                candidates = np.arange(len(matrix))
+                match_count = None
             
-            for offender_id, name, image_path, embedding_path in results:
-                try:
-                    # Load embedding
-                    with open(embedding_path, 'rb') as f:
-                        embedding_data = pickle.load(f)
-                    
-                    stored_encoding = embedding_data['primary_encoding']
-                    
-                    # Calculate face distance
-                    face_distance = face_recognition.face_distance([stored_encoding], query_encoding)[0]
-                    
-                    # Convert distance to similarity score (lower distance = higher similarity)
-                    similarity_score = 1 - face_distance
-                    
-                    if face_distance <= tolerance:
-                        similarities.append({
-                            'offender_id': offender_id,
-                            'name': name,
-                            'image_path': image_path,
-                            'similarity_score': similarity_score,
-                            'face_distance': face_distance
-                        })
-                
-                except Exception as e:
-                    logger.error(f"Error comparing with {offender_id}: {e}")
-                    continue
+            # Exact float32 scores for the shortlisted faces only
+            scores = matrix[candidates] @ query
+            within = scores >= min_score
+            candidates, scores = candidates[within], scores[within]
+            if match_count is None:
+                match_count = len(candidates)
+            order = np.argsort(-scores)[:top_k]
+            face_distances = np.sqrt(np.maximum(2 - 2 * scores[order], 0))
             
-            # Sort by similarity score (highest first)
-            similarities.sort(key=lambda x: x['similarity_score'], reverse=True)
+            similarities = []
+            for i, face_distance in zip(candidates[order], face_distances):
+                offender_id, name, image_path = self._rows[i]
+                face_distance = float(face_distance)
+                similarities.append({
+                    'offender_id': offender_id,
+                    'name': name,
+                    'image_path': image_path,
+                    # Convert distance to similarity score (lower distance = higher similarity)
+                    'similarity_score': 1 - face_distance,
+                    'face_distance': face_distance
+                })
             
             # Log search
-            self.log_search('face_search', query_image_path, len(similarities))
+            self.log_search('face_search', query_image_path, match_count)
             
-            return similarities[:top_k]
+            return similarities
             
         except Exception as e:
             logger.error(f"Error in face search: {e}")
             return []
     
+    def _search_hnsw(self, index, query: np.ndarray, top_k: int, tolerance: float) -> List[Dict]:
+        """Nearest faces from the HNSW graph, joined against SQLite for names and paths"""
+        # Ask for a few extra neighbours in case some labels belong to replaced rows, but
+        # never more than the live rows: get_current_count() includes deleted labels, and
+        # knn_query raises when it cannot return k neighbours
+        cursor = self._conn().cursor()
+        cursor.execute('SELECT COUNT(*) FROM face_embeddings WHERE embedding IS NOT NULL')
+        k = min(RESCORE_FACTOR * top_k, cursor.fetchone()[0])
+        if k == 0:
+            return []
+        labels, sq_distances = index.knn_query(query, k=k)
+        
+        labels = [int(label) for label in labels[0]]
+        cursor.execute(f'''
+            SELECT id, offender_id, name, image_path FROM face_embeddings
+            WHERE id IN ({','.join('?' * len(labels))})
+        ''', labels)
+        rows = {face_id: (offender_id, name, image_path) for face_id, offender_id, name, image_path in cursor.fetchall()}
+        
+        similarities = []
+        # hnswlib's l2 space reports squared distances, nearest first
+        for label, sq_distance in zip(labels, sq_distances[0]):
+            face_distance = float(np.sqrt(sq_distance))
+            if label not in rows or face_distance > tolerance:
+                continue
+            offender_id, name, image_path = rows[label]
+            similarities.append({
+                'offender_id': offender_id,
+                'name': name,
+                'image_path': image_path,
+                'similarity_score': 1 - face_distance,
+                'face_distance': face_distance
+            })
+            if len(similarities) == top_k:
+                break
+        
+        return similarities
+    
     def search_by_name(self, name_query: str) -> List[Dict]:
         """Search for offenders by name"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT offender_id, name, image_path, face_count 
-            FROM face_embeddings 
-            WHERE LOWER(name) LIKE LOWER(?)
-            ORDER BY name
-        ''', (f'%{name_query}%',))
+        cursor = self._conn().cursor()
+        
+        # Trigrams need at least three characters; shorter queries fall back to a scan
+        if self._name_fts and len(name_query) >= 3:
+            cursor.execute('''
+                SELECT offender_id, face_embeddings.name, image_path, face_count
+                FROM name_fts JOIN face_embeddings ON face_embeddings.id = name_fts.rowid
+                WHERE name_fts MATCH ?
+                ORDER BY face_embeddings.name
+            ''', ('"' + name_query.replace('"', '""') + '"',))
+        else:
+            cursor.execute('''
+                SELECT offender_id, name, image_path, face_count 
+                FROM face_embeddings 
+                WHERE LOWER(name) LIKE LOWER(?)
+                ORDER BY name
+            ''', (f'%{name_query}%',))
         
         results = cursor.fetchall()
-        conn.close()
         
         offenders = []
         for offender_id, name, image_path, face_count in results:
@@ -354,8 +857,7 @@ class FaceVectorDatabase:
     
     def get_all_offenders(self) -> List[Dict]:
         """Get all processed offenders"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn().cursor()
         
         cursor.execute('''
             SELECT offender_id, name, image_path, face_count, created_at
@@ -364,7 +866,6 @@ class FaceVectorDatabase:
         ''')
         
         results = cursor.fetchall()
-        conn.close()
         
         offenders = []
         for offender_id, name, image_path, face_count, created_at in results:
@@ -380,21 +881,18 @@ class FaceVectorDatabase:
     
     def log_search(self, query_type: str, query_data: str, results_count: int):
         """Log search queries for analytics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn().cursor()
         
         cursor.execute('''
             INSERT INTO search_history (query_type, query_data, results_count)
             VALUES (?, ?, ?)
         ''', (query_type, query_data, results_count))
         
-        conn.commit()
-        conn.close()
+        self._conn().commit()
     
     def get_database_stats(self) -> Dict:
         """Get database statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn().cursor()
         
         # Get total offenders
         cursor.execute('SELECT COUNT(*) FROM face_embeddings')
@@ -408,8 +906,6 @@ class FaceVectorDatabase:
         cursor.execute('SELECT COUNT(*) FROM search_history')
         total_searches = cursor.fetchone()[0]
         
-        conn.close()
-        
         return {
             'total_offenders': total_offenders,
             'total_faces': total_faces,
@@ -418,10 +914,17 @@ class FaceVectorDatabase:
             'embeddings_dir': str(self.embeddings_dir)
         }
     
+    def close(self):
+        """Save the HNSW index and close this thread's database connection"""
+        self.save_index()
+        conn = getattr(self._tls, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._tls.conn = None
+    
     def export_database(self, export_path: str = "face_vector_export.json"):
         """Export database to JSON for backup"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn().cursor()
         
         # Get all offenders
         cursor.execute('SELECT * FROM face_embeddings')
@@ -437,10 +940,11 @@ class FaceVectorDatabase:
             # Parse face locations
             if offender_dict['face_locations']:
                 offender_dict['face_locations'] = json.loads(offender_dict['face_locations'])
+            if offender_dict.get('embedding') is not None:
+                offender_dict['embedding'] = np.frombuffer(offender_dict['embedding'], dtype=np.float32) \
+                    .reshape(-1, EMBEDDING_DIM).tolist()
             offender_data.append(offender_dict)
         
-        conn.close()
-        
         # Save to JSON
         with open(export_path, 'w', encoding='utf-8') as f:
             json.dump(offender_data, f, indent=2, ensure_ascii=False)
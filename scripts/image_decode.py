@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Image decoding worker for the face database's CNN pipeline
+Kept apart from face_vector_db so spawned decode workers import only OpenCV and NumPy,
+not dlib, face_recognition or the vector index
+"""
+
+import logging
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+import numpy as np
+import cv2
+
+logger = logging.getLogger(__name__)
+
+def decode_image(image_path: str) -> np.ndarray:
+    """Decode an image to an RGB uint8 array with OpenCV (libjpeg-turbo), falling back to PIL"""
+    bgr = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
+    if bgr is None:
+        # Formats OpenCV can't read (e.g. some GIFs); PIL is only imported when needed
+        from PIL import Image
+        with Image.open(image_path) as image:
+            return np.array(image.convert('RGB'))
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+def decode_to_shared_memory(image_path: str) -> Tuple[str, Optional[str], Optional[Tuple], Optional[str]]:
+    """Pool worker: decode an image into a new shared memory block, returning (path, block name, shape, dtype)"""
+    try:
+        image = decode_image(image_path)
+        shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[:] = image
+        shm.close()
+        return image_path, shm.name, image.shape, image.dtype.str
+    except Exception as e:
+        logger.error(f"Error processing {image_path}: {e}")
+        return image_path, None, None, None
+
+def release_shared_memory(shm_name: Optional[str]):
+    """Unlink a block returned by decode_to_shared_memory that will never be read"""
+    if shm_name is None:
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
@@ -9,7 +9,7 @@ import sys
 from pathlib import Path
 import cv2
 import numpy as np
-from opencv_face_db import OpenCVFaceDatabase
+from opencv_face_db import OpenCVFaceDatabase, DETECT_PARAMS
 import logging
 
 # Set up logging
@@ -258,12 +258,7 @@ class OpenCVSearchInterface:
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             
             # Detect faces
-            faces = self.db.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
+            faces = self.db.face_cascade.detectMultiScale(gray, **DETECT_PARAMS)
             
             print(f"🔍 Detected {len(faces)} faces")
             
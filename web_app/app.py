@@ -6,7 +6,7 @@ Provides web interface for camera streams, video uploads, and object detection.
 import os
 import sys
 import json
-import base64
+import queue
 import threading
 import time
 import logging
@@ -23,6 +23,13 @@ import io
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from werkzeug.utils import secure_filename
 
+# libjpeg-turbo's SIMD encoder is several times faster than cv2.imencode; use it when installed
+try:
+    from turbojpeg import TurboJPEG
+    turbo_jpeg = TurboJPEG()
+except Exception:
+    turbo_jpeg = None
+
 try:
     from backend.video_processor import VideoProcessor
     from backend.camera_handler import CameraHandler
@@ -37,6 +44,8 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['STREAM_MAX_WIDTH'] = 960  # Frames wider than this are downscaled before streaming
+app.config['STREAM_JPEG_QUALITY'] = 80
 
 # Initialize SocketIO for real-time communication
 socketio = SocketIO(app, cors_allowed_origins="*")
@@ -64,6 +73,19 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def encode_stream_frame(frame):
+    """Downscale a frame to the streaming width and JPEG-encode it for the browser."""
+    max_width = app.config['STREAM_MAX_WIDTH']
+    height, width = frame.shape[:2]
+    if width > max_width:
+        frame = cv2.resize(frame, (max_width, int(height * max_width / width)), interpolation=cv2.INTER_AREA)
+    quality = app.config['STREAM_JPEG_QUALITY']
+    if turbo_jpeg is not None:
+        return turbo_jpeg.encode(frame, quality=quality)
+    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
 class WebVideoProcessor:
     """Web-specific video processor wrapper."""
     
@@ -73,6 +95,12 @@ class WebVideoProcessor:
         self.frame_buffer = None
         self.stats = {}
         
+        # Frames are encoded and emitted by one sender thread per processing run, so
+        # the processing loop never waits on JPEG encoding or the socket. A single
+        # sender keeps frames in order
+        self.send_queue = None
+        self._sender = None
+        
     def initialize(self, model_path=None, confidence=0.25, enable_tracking=True, target_classes=None):
         """Initialize the video processor."""
         try:
@@ -127,17 +155,57 @@ class WebVideoProcessor:
         global processing_stats
         processing_stats['total_frames'] = int(frame_number)
         
-        # Convert frames to base64 for web display
+        if self._sender is not None:
+            self._enqueue(self.send_queue, (processed_frame, frame_number, raw_frame))
+    
+    @staticmethod
+    def _enqueue(send_queue, item):
+        """Queue an item for the sender; newest wins, so a full queue drops its oldest frame."""
+        while True:
+            try:
+                send_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    send_queue.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    def _start_sender(self):
+        """Start the sender thread for a new processing run and return it."""
+        self._stop_sender()
+        self.send_queue = queue.Queue(maxsize=4)
+        self._sender = threading.Thread(target=self._send_frames, args=(self.send_queue,),
+                                        name='frame-sender', daemon=True)
+        self._sender.start()
+        return self._sender
+    
+    def _stop_sender(self, sender=None):
+        """Stop the sender thread with a sentinel; if sender is given, only when it is still current."""
+        if self._sender is None or (sender is not None and sender is not self._sender):
+            return
+        self._sender = None
+        self._enqueue(self.send_queue, None)
+    
+    def _send_frames(self, send_queue):
+        """Sender thread: encode queued frames and emit them to web clients until the sentinel."""
+        while True:
+            item = send_queue.get()
+            if item is None:
+                return
+            self._emit_frame(*item)
+    
+    def _emit_frame(self, processed_frame, frame_number, raw_frame=None):
+        """Encode a processed frame (and its raw frame) and emit it to web clients."""
+        # Encode frames as JPEG; Socket.IO sends bytes as binary attachments, so no base64 step
         try:
             # Processed frame
-            _, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            processed_base64 = base64.b64encode(buffer).decode('utf-8')
+            processed_jpeg = encode_stream_frame(processed_frame)
             
             # Raw frame (if provided)
-            raw_base64 = None
+            raw_jpeg = None
             if raw_frame is not None:
-                _, raw_buffer = cv2.imencode('.jpg', raw_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                raw_base64 = base64.b64encode(raw_buffer).decode('utf-8')
+                raw_jpeg = encode_stream_frame(raw_frame)
             
             # Get timeline statistics
             timeline_stats = {}
@@ -147,8 +215,8 @@ class WebVideoProcessor:
             # Emit frame data to web clients
             frame_data = {
                 'frame_number': int(frame_number),
-                'processed_frame': processed_base64,
-                'raw_frame': raw_base64,
+                'processed_frame': processed_jpeg,
+                'raw_frame': raw_jpeg,
                 'timestamp': datetime.now().isoformat(),
                 'timeline_stats': timeline_stats
             }
@@ -173,6 +241,7 @@ class WebVideoProcessor:
             return False
         
         self.is_running = True
+        sender = self._start_sender()
         
         def process_camera():
             try:
@@ -187,6 +256,7 @@ class WebVideoProcessor:
                 socketio.emit('processing_error', {'error': str(e)})
             finally:
                 self.is_running = False
+                self._stop_sender(sender)
         
         # Start processing in separate thread
         thread = threading.Thread(target=process_camera, daemon=True)
@@ -199,6 +269,7 @@ class WebVideoProcessor:
             return False
         
         self.is_running = True
+        sender = self._start_sender()
         
         def process_video():
             try:
@@ -213,6 +284,7 @@ class WebVideoProcessor:
                 socketio.emit('processing_error', {'error': str(e)})
             finally:
                 self.is_running = False
+                self._stop_sender(sender)
         
         # Start processing in separate thread
         thread = threading.Thread(target=process_video, daemon=True)
@@ -224,6 +296,7 @@ class WebVideoProcessor:
         if self.processor:
             self.processor.stop_processing()
         self.is_running = False
+        self._stop_sender()
 
 
 # Initialize web video processor
@@ -374,6 +374,18 @@ async function stopProcessing() {
     }
 }
 
+function showJpegFrame(img, jpegBytes) {
+    // Frames arrive as binary JPEG attachments; show them through a blob URL
+    // and release the previous one so they don't accumulate in memory
+    const previousUrl = img.dataset.blobUrl;
+    const url = URL.createObjectURL(new Blob([jpegBytes], { type: 'image/jpeg' }));
+    img.dataset.blobUrl = url;
+    img.src = url;
+    if (previousUrl) {
+        URL.revokeObjectURL(previousUrl);
+    }
+}
+
 function updateVideoFeeds(data) {
     // Update raw video feed
     if (data.raw_frame) {
@@ -382,7 +394,7 @@ function updateVideoFeeds(data) {
         
         rawPlaceholder.style.display = 'none';
         rawVideoFeed.style.display = 'block';
-        rawVideoFeed.src = 'data:image/jpeg;base64,' + data.raw_frame;
+        showJpegFrame(rawVideoFeed, data.raw_frame);
     }
     
     // Update processed video feed
@@ -392,7 +404,7 @@ function updateVideoFeeds(data) {
         
         processedPlaceholder.style.display = 'none';
         processedVideoFeed.style.display = 'block';
-        processedVideoFeed.src = 'data:image/jpeg;base64,' + data.processed_frame;
+        showJpegFrame(processedVideoFeed, data.processed_frame);
     }
     
     // Update frame counter (less frequently)